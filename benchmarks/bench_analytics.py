@@ -0,0 +1,96 @@
+"""
+Benchmark of the spending reports of bookkeeper.analytics against the
+per-row sums of Expense objects (what a repository without SQL does in
+sum_by), on a generated ledger of several years.
+
+    python -m benchmarks.bench_analytics [number of expenses]
+"""
+
+import sys
+from datetime import datetime, timedelta
+from random import Random
+from time import perf_counter
+from typing import Any, Callable
+
+from bookkeeper.analytics import ExpenseColumns, Rollups, rollups
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.columnar_repository import ColumnarRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Period, fold_sum
+
+
+def ledger(size: int, years: int = 5, categories: int = 50) -> list[Expense]:
+    """
+    Random expenses spread over some years.
+    """
+    rng = Random(0)
+    start = datetime(2020, 1, 1)
+    minutes = years * 365 * 24 * 60
+    return [
+        Expense(
+            rng.randrange(1, 100_000),
+            rng.randrange(categories),
+            start + timedelta(minutes=rng.randrange(minutes)),
+        )
+        for _ in range(size)
+    ]
+
+
+def timed(name: str, func: Callable[[], Any]) -> Any:
+    """
+    Run a function once and print how long it took.
+    """
+    start = perf_counter()
+    result = func()
+    print(f"{name:<40} {perf_counter() - start:8.3f} s")
+    return result
+
+
+def per_row(expenses: list[Expense]) -> dict[str, Any]:
+    """
+    The reports made by summing Expense objects one by one.
+    """
+    reports = {
+        unit: fold_sum(expenses, "amount", Period("expense_date", unit))
+        for unit in ("day", "week", "month")
+    }
+    reports["category"] = fold_sum(expenses, "amount", "category")
+    return reports
+
+
+def columnar(report: Rollups) -> dict[str, Any]:
+    """
+    The same reports made of rollups.
+    """
+    reports: dict[str, Any] = {
+        unit: report.by_period(unit) for unit in ("day", "week", "month")
+    }
+    reports["category"] = report.by_category()
+    return reports
+
+
+def main(size: int) -> None:
+    """
+    Print the timings of the reports over a ledger of the given size.
+    """
+    expenses = timed(f"generate {size} expenses", lambda: ledger(size))
+    memory: MemoryRepository[Expense] = MemoryRepository()
+    memory.add_many(expenses)
+    column_repo = ColumnarRepository()
+    copies = ledger(size)
+    timed("fill a columnar repository", lambda: column_repo.add_many(copies))
+    expected = timed("per-row reports", lambda: per_row(expenses))
+    columns = timed(
+        "expense columns from objects", lambda: ExpenseColumns.from_expenses(expenses)
+    )
+    report = timed("rollups of the columns", lambda: Rollups([columns]))
+    assert timed("reports of the rollups", lambda: columnar(report)) == expected
+    timed("rolling 30 day average", lambda: report.rolling_average(30))
+    timed("top 10 categories", lambda: report.top_categories(10))
+    timed("rollups of a memory repository", lambda: rollups(memory, batch_size=50_000))
+    report = timed("rollups of a columnar repository", lambda: rollups(column_repo))
+    assert columnar(report) == expected
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
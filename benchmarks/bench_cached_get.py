@@ -0,0 +1,53 @@
+"""
+Benchmark of a warm CachedRepository.get, with and without a ttl, against
+the get of the repositories it wraps.
+
+    python -m benchmarks.bench_cached_get [number of gets]
+
+The SQLite database is made in a temporary directory.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+from timeit import repeat
+from typing import Any
+
+from bookkeeper.models.category import Category
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+def timed(name: str, repo: Any, pk: int, number: int) -> None:
+    """
+    Print the time of a get of the best of five runs of number gets.
+    """
+    get = repo.get
+    get(pk)
+    best = min(repeat(lambda: get(pk), number=number, repeat=5))
+    print(f"{name:<45} {best / number * 1e9:8.0f} ns")
+
+
+def main(number: int) -> None:
+    """
+    Print the timings of the gets of one category.
+    """
+    memory: MemoryRepository[Category] = MemoryRepository()
+    pk = memory.add(Category("food"))
+    with tempfile.TemporaryDirectory() as tmp:
+        with SQLiteRepository(str(Path(tmp) / "bench.db"), Category) as sqlite:
+            sqlite.add(Category("food"))
+            timed("SQLiteRepository.get", sqlite, pk, number // 100)
+            timed("MemoryRepository.get", memory, pk, number)
+            timed("CachedRepository.get", CachedRepository(sqlite), pk, number)
+            timed(
+                "CachedRepository.get with a ttl",
+                CachedRepository(sqlite, ttl=60),
+                pk,
+                number,
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,106 @@
+"""
+Benchmark of the category traversals on synthetic trees, against the
+recursive generators they replaced.
+
+    python -m benchmarks.bench_category_traversal [number of nodes] [depth]
+
+A tree is a path of the given depth with the rest of the nodes hung under
+random nodes of the path.
+"""
+
+import sys
+from collections import defaultdict
+from random import Random
+from time import perf_counter
+from typing import Any, Callable, Iterator
+
+from bookkeeper.models.category import Category
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+
+def make_tree(size: int, depth: int) -> MemoryRepository[Category]:
+    """
+    A repository of a tree of size categories that is depth levels deep.
+    """
+    rng = Random(0)
+    repo: MemoryRepository[Category] = MemoryRepository(indexes=("parent",))
+    parent = None
+    for level in range(depth):
+        parent = repo.add(Category(f"path {level}", parent))
+    for i in range(size - depth):
+        repo.add(Category(f"leaf {i}", rng.randint(1, depth)))
+    return repo
+
+
+def recursive_parents(
+    cat: Category, repo: MemoryRepository[Category]
+) -> Iterator[Category]:
+    """
+    Category.get_all_parents as it used to be.
+    """
+    parent = cat.get_parent(repo)
+    if parent is None:
+        return
+    yield parent
+    yield from recursive_parents(parent, repo)
+
+
+def recursive_subcategories(
+    cat: Category, repo: MemoryRepository[Category]
+) -> Iterator[Category]:
+    """
+    Category.get_subcategories as it used to be.
+    """
+
+    def get_children(
+        graph: dict[int | None, list[Category]], root: int
+    ) -> Iterator[Category]:
+        for x in graph[root]:
+            yield x
+            yield from get_children(graph, x.pk)
+
+    subcats = defaultdict(list)
+    for sub in repo.get_all_where():
+        subcats[sub.parent].append(sub)
+    return get_children(subcats, cat.pk)
+
+
+def timed(name: str, func: Callable[[], Iterator[Any]]) -> None:
+    """
+    Exhaust an iterator and print how long it took.
+    """
+    start = perf_counter()
+    try:
+        count = sum(1 for _ in func())
+    except RecursionError:
+        print(f"{name:<45} RecursionError")
+        return
+    print(f"{name:<45} {perf_counter() - start:8.3f} s ({count} categories)")
+
+
+def main(size: int, depth: int) -> None:
+    """
+    Print the timings of the traversals of a tree and of a tree shallow enough
+    for the recursive generators.
+    """
+    for tree_depth in (depth, min(depth, sys.getrecursionlimit() // 2)):
+        repo = make_tree(size, tree_depth)
+        root = repo.get(1)
+        bottom = repo.get(tree_depth)
+        assert root is not None and bottom is not None
+        print(f"{size} categories, depth {tree_depth}")
+        timed("get_all_parents of the deepest one", lambda: bottom.get_all_parents(repo))
+        timed("recursive parents", lambda: recursive_parents(bottom, repo))
+        timed("get_subcategories dfs of the root", lambda: root.get_subcategories(repo))
+        timed(
+            "get_subcategories bfs of the root",
+            lambda: root.get_subcategories(repo, "bfs"),
+        )
+        timed("recursive subcategories", lambda: recursive_subcategories(root, repo))
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10_000,
+    )
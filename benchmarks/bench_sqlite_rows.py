@@ -0,0 +1,96 @@
+"""
+Benchmark of reading expenses from an SQLite repository, against the way
+rows were read before: SQL text with the pk in it, SELECT * and an entry
+made of a dictionary of fields for every row.
+
+    python -m benchmarks.bench_sqlite_rows [number of expenses] [number of gets]
+
+The database is made in a temporary directory.
+"""
+
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from random import Random
+from time import perf_counter
+from typing import Any, Callable
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.money import Money
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+def old_get(repo: SQLiteRepository[Expense], pk: int) -> Expense | None:
+    """
+    SQLiteRepository.get as it used to be.
+    """
+    row = (
+        repo._pool.connection()  # pylint: disable=protected-access
+        .execute(f"""SELECT * FROM {repo.table_name} WHERE id=={pk}""")
+        .fetchone()
+    )
+    if not row:
+        return None
+    fields = dict(zip(repo.fields, row[1:]))
+    fields["pk"] = row[0]
+    return Expense(**fields)
+
+
+def old_get_all(repo: SQLiteRepository[Expense]) -> list[Expense]:
+    """
+    SQLiteRepository.get_all_where as it used to be.
+    """
+    rows = (
+        repo._pool.connection()  # pylint: disable=protected-access
+        .execute(f"""SELECT * FROM {repo.table_name}""")
+        .fetchall()
+    )
+    res = []
+    for row in rows:
+        fields = dict(zip(repo.fields, row[1:]))
+        fields["pk"] = row[0]
+        res.append(Expense(**fields))
+    return res
+
+
+def timed(name: str, func: Callable[[], Any]) -> None:
+    """
+    Run a function and print how long it took.
+    """
+    start = perf_counter()
+    func()
+    print(f"{name:<45} {perf_counter() - start:8.3f} s")
+
+
+def main(size: int, gets: int) -> None:
+    """
+    Print the timings of single-entry gets and of reading the whole table.
+    """
+    rng = Random(0)
+    start = datetime(2020, 1, 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        with SQLiteRepository(str(Path(tmp) / "bench.db"), Expense) as repo:
+            repo.add_many(
+                Expense(
+                    Money(rng.randint(1, 100_000)),
+                    rng.randint(1, 50),
+                    start + timedelta(minutes=rng.randint(0, 10**6)),
+                    f"comment {i % 100}",
+                )
+                for i in range(size)
+            )
+            pks = [rng.randint(1, size) for _ in range(gets)]
+            assert old_get(repo, pks[0]) == repo.get(pks[0])
+            print(f"{size} expenses, {gets} gets")
+            timed("get, pk in the SQL text", lambda: [old_get(repo, pk) for pk in pks])
+            timed("get, pk as a parameter", lambda: [repo.get(pk) for pk in pks])
+            timed("all rows, SELECT * and dictionaries", lambda: old_get_all(repo))
+            timed("all rows, row factory", repo.get_all_where)
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 100_000,
+    )
@@ -0,0 +1,268 @@
+"""
+Spending reports module: daily, weekly, monthly and per-category rollups,
+rolling averages and top categories of expenses.
+
+Reports work on expense columns (ExpenseColumns) rather than on Expense
+objects. Columns can be loaded from any repository a batch at a time and
+are aggregated one batch after another, so a ledger never has to be in
+memory at once:
+
+    rollups = Rollups()
+    for batch in iter_columns(repo, batch_size=50_000):
+        rollups.add(batch)
+    rollups.by_period("month")
+    rollups.rolling_average(7)
+    rollups.top_categories(3)
+
+A batch is summed by day and by category in a single pass, weeks and months
+are made of the day sums, so the cost of a report beyond that pass depends
+on the number of days, not on the number of expenses.
+"""
+
+from array import array
+from datetime import date, timedelta
+from heapq import nlargest
+from itertools import accumulate, chain, compress, islice, repeat
+from operator import floordiv, itemgetter, sub
+from typing import Any, Iterable, Iterator
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.money import Money
+from bookkeeper.repository.abstract_repository import RepositoryProtocol
+from bookkeeper.repository.columnar_repository import ColumnarRepository
+from bookkeeper.repository.query import Period
+
+_EPOCH_DAY = date(1970, 1, 1).toordinal()
+_DAY_US = 24 * 3600 * 10**6
+# a batch with a longer span of days than this per expense is summed in a dict
+_DENSE_DAYS_PER_ROW = 8
+
+
+class ExpenseColumns:
+    """
+    Amounts (minor units), days (proleptic Gregorian ordinals, see
+    date.toordinal) and categories of expenses as columns.
+
+    Categories are stored as codes of their values: category_values[code].
+    The columns are empty unless they are given, with category codes that
+    index the given category values.
+    """
+
+    __slots__ = ("amounts", "days", "categories", "category_values", "_codes")
+
+    def __init__(
+        self,
+        amounts: array | None = None,
+        days: array | None = None,
+        categories: array | None = None,
+        category_values: Iterable[Any] = (),
+    ) -> None:
+        self.amounts = array("q") if amounts is None else amounts
+        self.days = array("q") if days is None else days
+        self.categories = array("q") if categories is None else categories
+        self.category_values: list[Any] = list(category_values)
+        self._codes: dict[Any, int] = {
+            value: code for code, value in enumerate(self.category_values)
+        }
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def _code(self, category: Any) -> int:
+        code = self._codes.get(category)
+        if code is None:
+            code = self._codes[category] = len(self.category_values)
+            self.category_values.append(category)
+        return code
+
+    def append(self, exp: Expense) -> None:
+        """
+        Add the fields of an expense to the columns.
+        """
+        self.amounts.append(exp.amount)
+        self.days.append(exp.expense_date.toordinal())
+        self.categories.append(self._code(exp.category))
+
+    def extend(self, expenses: Iterable[Expense]) -> None:
+        """
+        Add the fields of several expenses to the columns.
+        """
+        for exp in expenses:
+            self.append(exp)
+
+    @classmethod
+    def from_expenses(cls, expenses: Iterable[Expense]) -> "ExpenseColumns":
+        """
+        Get the columns of expenses.
+        """
+        columns = cls()
+        columns.extend(expenses)
+        return columns
+
+    @classmethod
+    def from_columnar(
+        cls, repo: ColumnarRepository, where: dict[str, Any] | None = None
+    ) -> "ExpenseColumns":
+        """
+        Get the columns of the expenses of a columnar repository that satisfy
+        all "where" conditions, without creating Expense objects.
+        """
+        dates = repo.column("expense_date", where)
+        days = array(
+            "q", map(sub, map(floordiv, dates, repeat(_DAY_US)), repeat(-_EPOCH_DAY))
+        )
+        categories = repo.column("category", where)
+        category_values = sorted(set(categories))
+        codes = {value: code for code, value in enumerate(category_values)}
+        return cls(
+            repo.column("amount", where),
+            days,
+            array("q", map(codes.__getitem__, categories)),
+            category_values,
+        )
+
+
+def iter_columns(
+    repo: RepositoryProtocol[Expense],
+    where: dict[str, Any] | None = None,
+    batch_size: int = 10_000,
+) -> Iterator[ExpenseColumns]:
+    """
+    Iterate over the columns of the expenses of a repository that satisfy all
+    "where" conditions, batch_size expenses at a time. A columnar repository
+    gives all of them in a single batch.
+    """
+    if isinstance(repo, ColumnarRepository):
+        yield ExpenseColumns.from_columnar(repo, where)
+        return
+    expenses = repo.iter_where(where, batch_size)
+    while batch := ExpenseColumns.from_expenses(islice(expenses, batch_size)):
+        yield batch
+
+
+def _period_starts(first: date, last: date, unit: str) -> Iterator[date]:
+    """
+    Iterate over the first days of the periods from the one of first to
+    the one of last.
+    """
+    period = Period("", unit)
+    start, stop = period.key(first), period.key(last)
+    assert start is not None and stop is not None
+    while start <= stop:
+        yield start
+        if unit == "day":
+            start += timedelta(days=1)
+        elif unit == "week":
+            start += timedelta(days=7)
+        else:
+            start = (start + timedelta(days=31)).replace(day=1)
+
+
+class Rollups:
+    """
+    Sums of expenses by day and by category, and the reports that are made
+    of them. Expense columns are added to the sums a batch at a time.
+    """
+
+    def __init__(self, batches: Iterable[ExpenseColumns] = ()) -> None:
+        self._days: dict[int, int] = {}
+        self._categories: dict[Any, int] = {}
+        for batch in batches:
+            self.add(batch)
+
+    def add(self, columns: ExpenseColumns) -> None:
+        """
+        Add a batch of expense columns to the sums.
+        """
+        if not columns:
+            return
+        first, last = min(columns.days), max(columns.days)
+        if last - first < _DENSE_DAYS_PER_ROW * len(columns):
+            day_totals = [0] * (last - first + 1)
+            for offset, amount in zip(
+                map(sub, columns.days, repeat(first)), columns.amounts
+            ):
+                day_totals[offset] += amount
+            days = self._days
+            for offset in compress(range(len(day_totals)), day_totals):
+                day = first + offset
+                days[day] = days.get(day, 0) + day_totals[offset]
+        else:
+            for day, amount in zip(columns.days, columns.amounts):
+                self._days[day] = self._days.get(day, 0) + amount
+        category_totals = [0] * len(columns.category_values)
+        for code, amount in zip(columns.categories, columns.amounts):
+            category_totals[code] += amount
+        for category, total in zip(columns.category_values, category_totals):
+            self._categories[category] = self._categories.get(category, 0) + total
+
+    def total(self) -> Money:
+        """
+        Get the sum of all expenses.
+        """
+        return Money(sum(self._days.values()))
+
+    def by_period(self, unit: str = "day") -> dict[date, Money]:
+        """
+        Get the sums of the periods ("day", "week" or "month") that have
+        expenses, keyed by the first day of the period, in date order.
+        """
+        period = Period("", unit)
+        totals: dict[date, int] = {}
+        for day in sorted(self._days):
+            key = period.key(date.fromordinal(day))
+            assert key is not None
+            totals[key] = totals.get(key, 0) + self._days[day]
+        return {key: Money(total) for key, total in totals.items()}
+
+    def by_category(self) -> dict[Any, Money]:
+        """
+        Get the sums of the categories that have expenses.
+        """
+        return {category: Money(total) for category, total in self._categories.items()}
+
+    def rolling_average(self, window: int, unit: str = "day") -> dict[date, Money]:
+        """
+        Get the average sum of the last window periods (including the current
+        one) for every period from the first to the last one with expenses.
+        Periods with no expenses count as zero, the first periods are averaged
+        over the periods there are. Averages are rounded to minor units.
+        """
+        if window < 1:
+            raise ValueError("the window must be at least one period")
+        totals = self.by_period(unit)
+        if not totals:
+            return {}
+        starts = list(_period_starts(min(totals), max(totals), unit))
+        series = [totals.get(start, 0) for start in starts]
+        sums = list(accumulate(series, initial=0))
+        window_sums = map(
+            sub, islice(sums, 1, None), chain(repeat(0, window - 1), sums)
+        )
+        return {
+            start: Money(round(window_sum / min(i + 1, window)))
+            for i, (start, window_sum) in enumerate(zip(starts, window_sums))
+        }
+
+    def top_categories(self, n: int) -> list[tuple[Any, Money]]:
+        """
+        Get n categories with the largest sums and their sums, largest first.
+        """
+        return [
+            (category, Money(total))
+            for category, total in nlargest(
+                n, self._categories.items(), key=itemgetter(1)
+            )
+        ]
+
+
+def rollups(
+    repo: RepositoryProtocol[Expense],
+    where: dict[str, Any] | None = None,
+    batch_size: int = 10_000,
+) -> Rollups:
+    """
+    Get the rollups of the expenses of a repository that satisfy all "where"
+    conditions, loaded batch_size expenses at a time.
+    """
+    return Rollups(iter_columns(repo, where, batch_size))
@@ -0,0 +1,232 @@
+"""
+Budget tracker module.
+"""
+
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Iterable, Sequence
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.money import Money
+from bookkeeper.repository.abstract_repository import RepositoryProtocol
+from bookkeeper.repository.events import Added, Deleted, RepositoryEvent, Updated
+from bookkeeper.repository.query import Between, Ge, Period
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, time())
+
+
+def _next_start(unit: str, start: date) -> date:
+    """
+    Get the first day of the period after the one that starts on start.
+    """
+    if unit == "day":
+        return start + timedelta(days=1)
+    if unit == "week":
+        return start + timedelta(days=7)
+    return (start + timedelta(days=31)).replace(day=1)
+
+
+class BudgetTracker:
+    """
+    Spend counters of an expense repository per day, week and month and per
+    category, and the spent sums of budgets.
+
+    The counters are built from the repository once, when the tracker is
+    created, then every added, updated or deleted expense adjusts them in O(1)
+    (by the old entry of an update, so the repository must give one).
+    Period counters are kept from the first day of the week or the month
+    of the day they are built on (whichever comes first); the sums of older
+    periods are asked from the repository when they are needed.
+    A period counter is keyed by the first day of the period, so a new day,
+    week or month starts with a counter of its own; the budgets are switched
+    to the new period when the date changes.
+
+    The tracker follows the repository from the moment it is created. Changes
+    made while the counters are being built are held back and counted once
+    they are, so the counters may be built in another thread, e.g.
+
+        tracker = BudgetTracker(repo, build=False)
+        # in a worker thread, while the repository is being changed
+        tracker.rebuild()
+
+    Budget periods are "day", "week" or "month".
+    """
+
+    units = ("day", "week", "month")
+
+    def __init__(
+        self,
+        repo: RepositoryProtocol[Expense],
+        budgets: Iterable[Budget] = (),
+        today: Callable[[], date] = date.today,
+        build: bool = True,
+    ) -> None:
+        self.repo = repo
+        self._today = today
+        self._periods = {unit: Period("expense_date", unit) for unit in self.units}
+        self._by_period: dict[str, dict[date, Money]] = {
+            unit: {} for unit in self.units
+        }
+        self._by_category: dict[int, Money] = {}
+        # first day of the period counters, None until they are built
+        self._start: date | None = None
+        self.budgets: list[Budget] = []
+        self._day = today()
+        # events that came while the counters were being built, None once they are
+        self._pending: list[RepositoryEvent[Expense]] | None = []
+        self._lock = threading.Lock()
+        repo.subscribe(self._on_change)
+        if build:
+            self.rebuild()
+        for budget in budgets:
+            self.add_budget(budget)
+
+    def close(self) -> None:
+        """
+        Stop following the changes of the repository.
+        """
+        self.repo.unsubscribe(self._on_change)
+
+    def rebuild(self, cancelled: Callable[[], bool] = lambda: False) -> bool:
+        """
+        Compute all counters from the repository from scratch: the daily sums
+        since the start of the current week or month and the sums of the
+        categories, with one sum_by each. Then count the changes made while
+        they were being computed.
+
+        cancelled is checked after each sum_by, once it returns True the
+        counters are left as they were, changes keep being held back until
+        another rebuild and False is returned.
+        """
+        today = self._today()
+        week, month = self._periods["week"].key(today), self._periods["month"].key(today)
+        assert week is not None and month is not None
+        start = min(week, month)
+        with self._lock:
+            # the changes that came before are in the sums
+            self._pending = []
+        by_day = self.repo.sum_by(
+            "amount",
+            group_by=self._periods["day"],
+            where={"expense_date": Ge(_midnight(start))},
+        )
+        if cancelled():
+            return False
+        with self._lock:
+            assert self._pending is not None
+            # the changes that came after this one aren't in the day sums only
+            mark = len(self._pending)
+        by_category = self.repo.sum_by("amount", group_by="category")
+        if cancelled():
+            return False
+        with self._lock:
+            self._start, self._day = start, today
+            self._by_category = by_category
+            self._by_period = {
+                unit: self._roll_up(period, by_day)
+                for unit, period in self._periods.items()
+            }
+            for budget in self.budgets:
+                self._reset(budget)
+            pending, self._pending = self._pending, None
+            self._apply(pending[:mark], categories=False)
+            self._apply(pending[mark:])
+        return True
+
+    @staticmethod
+    def _roll_up(period: Period, by_day: dict[date, Money]) -> dict[date, Money]:
+        totals: dict[date, Money] = {}
+        for day, total in by_day.items():
+            key = period.key(day)
+            assert key is not None
+            totals[key] = totals.get(key, Money(0)) + total
+        return totals
+
+    def add_budget(self, budget: Budget) -> None:
+        """
+        Start tracking a budget, its spent sum is set to the sum of the current
+        period.
+        """
+        if budget.period not in self._periods:
+            raise ValueError(f"unknown budget period {budget.period!r}")
+        self.budgets.append(budget)
+        self._reset(budget)
+
+    def _reset(self, budget: Budget) -> None:
+        budget.count_in(self.spent(budget.period) - budget.get_spent())
+
+    def _roll_over(self) -> None:
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            for budget in self.budgets:
+                self._reset(budget)
+
+    def spent(self, unit: str = "day", day: date | None = None) -> Money:
+        """
+        Get the sum of the expenses of a period ("day", "week" or "month")
+        that the day (today by default) belongs to.
+        """
+        key = self._periods[unit].key(day or self._today())
+        assert key is not None
+        if self._start is not None and key >= self._start:
+            return self._by_period[unit].get(key, Money(0))
+        end = _next_start(unit, key)
+        where = {
+            "expense_date": Between(
+                _midnight(key), _midnight(end) - timedelta(microseconds=1)
+            )
+        }
+        return Money(self.repo.sum_by("amount", where=where).get(None) or 0)
+
+    def spent_in_category(self, category: int) -> Money:
+        """
+        Get the sum of all expenses of a category.
+        """
+        return self._by_category.get(category, Money(0))
+
+    def over_budget(self) -> list[Budget]:
+        """
+        Get the budgets that are exceeded in their current period.
+        """
+        self._roll_over()
+        return [budget for budget in self.budgets if budget.get_spent() > budget.amount]
+
+    def _count(self, exp: Expense, sign: int, categories: bool = True) -> None:
+        amount = sign * exp.amount
+        assert self._start is not None
+        for unit, period in self._periods.items():
+            key = period.key(exp.expense_date)
+            if key is not None and key >= self._start:
+                counter = self._by_period[unit]
+                counter[key] = counter.get(key, Money(0)) + amount
+        if categories:
+            self._by_category[exp.category] = (
+                self._by_category.get(exp.category, Money(0)) + amount
+            )
+        for budget in self.budgets:
+            period = self._periods[budget.period]
+            if period.key(exp.expense_date) == period.key(self._day):
+                budget.count_in(amount)
+
+    def _apply(self, events: Iterable[RepositoryEvent[Any]], **kwargs: Any) -> None:
+        for event in events:
+            if isinstance(event, Added):
+                self._count(event.obj, 1, **kwargs)
+            elif isinstance(event, Updated):
+                if event.old is not None:
+                    self._count(event.old, -1, **kwargs)
+                self._count(event.new, 1, **kwargs)
+            elif isinstance(event, Deleted):
+                self._count(event.obj, -1, **kwargs)
+
+    def _on_change(self, events: Sequence[RepositoryEvent[Expense]]) -> None:
+        with self._lock:
+            if self._pending is not None:
+                self._pending.extend(events)
+                return
+            self._roll_over()
+            self._apply(events)
@@ -1,5 +1,7 @@
 from dataclasses import dataclass
 
+from bookkeeper.models.money import Money
+
 
 @dataclass(slots=True)
 class Budget:
@@ -8,22 +10,26 @@ class Budget:
     Not fully implemented.
 
     period - time period in dats
-    amount - total sum
+    amount - total sum in minor units, an int is taken as Money
     spent - already spent money
     """
 
-    amount: float
+    amount: Money
     period: str
-    _spent: float = 0
+    _spent: Money = Money(0)
     pk: int = 0
 
-    def count_in(self, exp: float):
+    def __post_init__(self) -> None:
+        self.amount = Money(self.amount)
+        self._spent = Money(self._spent)
+
+    def count_in(self, exp: int):
         """
         Take a new expense into account.
         """
         self._spent += exp
 
-    def get_spent(self) -> float:
+    def get_spent(self) -> Money:
         """
         Getter for the spent attribute.
         """
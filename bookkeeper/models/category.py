@@ -1,11 +1,37 @@
 """
 Category class module.
 """
-from collections import defaultdict
+from collections import defaultdict, deque
 from dataclasses import dataclass
-from typing import Iterator
+from itertools import islice
+from typing import Any, ClassVar, Iterable, Iterator, Sequence
 
 from bookkeeper.repository.abstract_repository import RepositoryProtocol
+from bookkeeper.repository.events import Added, Deleted, RepositoryEvent, Updated
+
+
+def _walk_bfs(
+    subcats: dict[int | None, list["Category"]], pk: int | None
+) -> Iterator["Category"]:
+    queue = deque(subcats[pk])
+    while queue:
+        cat = queue.popleft()
+        yield cat
+        queue.extend(subcats[cat.pk])
+
+
+def _walk_dfs(
+    subcats: dict[int | None, list["Category"]], pk: int | None
+) -> Iterator["Category"]:
+    # iterators over the children of the categories on the current path
+    stack = [iter(subcats[pk])]
+    while stack:
+        child = next(stack[-1], None)
+        if child is None:
+            stack.pop()
+            continue
+        yield child
+        stack.append(iter(subcats[child.pk]))
 
 
 @dataclass
@@ -13,8 +39,11 @@ class Category:
     """
     Expense category, stores the expense name and the parent category's id.
     For a top-level Category parent is None.
+    indexed_fields - fields that repositories should index.
     """
 
+    indexed_fields: ClassVar[tuple[str, ...]] = ("parent", "name")
+
     name: str
     parent: int | None = None
     pk: int = 0
@@ -51,43 +80,46 @@ class Category:
         Parent Category objects and higher.
         """
         parent = self.get_parent(repo)
-        if parent is None:
-            return
-        yield parent
-        yield from parent.get_all_parents(repo)
+        while parent is not None:
+            yield parent
+            parent = parent.get_parent(repo)
 
     def get_subcategories(
-        self, repo: RepositoryProtocol["Category"]
+        self, repo: RepositoryProtocol["Category"], order: str = "dfs"
     ) -> Iterator["Category"]:
         """
         Get all subcategories of the hierarchy, i.e. all subcategories of
         this one, all their subcategories etc.
 
+        The hierarchy is loaded from the repository once, when the method
+        is called, and walked with an explicit stack or queue, so each
+        subcategory takes O(1) however deep the tree is.
+
         Parameters
         ----------
         repo - repository to get objects from.
+        order - "dfs" for depth-first order (a subcategory is followed by its
+        subcategories), "bfs" for breadth-first order (level by level).
 
-        Yields
+        Returns
         -------
-        Category type objects, that are different level subcategories of this one.
+        Iterator over Category type objects, that are different level
+        subcategories of this one.
         """
-
-        def get_children(
-            graph: dict[int | None, list["Category"]], root: int
-        ) -> Iterator["Category"]:
-            """DFS of the graph from the root."""
-            for x in graph[root]:
-                yield x
-                yield from get_children(graph, x.pk)
-
-        subcats = defaultdict(list)
-        for cat in repo.get_all_where():
+        if order not in ("dfs", "bfs"):
+            raise ValueError(f"unknown traversal order {order!r}")
+        subcats: dict[int | None, list[Category]] = defaultdict(list)
+        for cat in repo.get_all_where() or []:
             subcats[cat.parent].append(cat)
-        return get_children(subcats, self.pk)
+        if order == "bfs":
+            return _walk_bfs(subcats, self.pk)
+        return _walk_dfs(subcats, self.pk)
 
     @classmethod
     def create_from_tree(
-        cls, tree: list[tuple[str, str | None]], repo: RepositoryProtocol["Category"]
+        cls,
+        tree: Iterable[tuple[str, str | None]],
+        repo: RepositoryProtocol["Category"],
     ) -> list["Category"]:
         """
         Create a tree of (child-parent) pairs of Caterogies.
@@ -98,9 +130,15 @@ class Category:
         result could be correct if the initial data is correct except for sorting, and
         couldn't otherwise, "garbage in, garbage out".
 
+        All categories are added with a single add_many call, i.e. in one
+        transaction: the pairs are consumed one at a time and every category
+        gets its pk before the next pair is read, so the parents' pks are known
+        when their children are created. Either the whole tree is added or,
+        e.g. for a parent that comes after its child (KeyError), none of it.
+
         Parameters
         ----------
-        tree - list of (child-parent) pair.
+        tree - iterable of (child-parent) pairs, e.g. the result of read_tree.
         repo - repository to store the objects.
 
         Returns
@@ -108,8 +146,245 @@ class Category:
         List of the created Category objects.
         """
         created: dict[str, Category] = {}
-        for child, parent in tree:
-            cat = cls(child, created[parent].pk if parent is not None else None)
-            repo.add(cat)
-            created[child] = cat
+
+        def categories() -> Iterator[Category]:
+            for child, parent in tree:
+                cat = cls(child, created[parent].pk if parent is not None else None)
+                yield cat
+                created[child] = cat  # with the pk set by add_many
+
+        repo.add_many(categories())
         return list(created.values())
+
+    @classmethod
+    def import_tree(
+        cls,
+        tree: Iterable[tuple[str, str | None]],
+        repo: RepositoryProtocol["Category"],
+        batch_size: int = 10_000,
+    ) -> int:
+        """
+        Add a tree of (child-parent) pairs of an indented text, e.g. from
+        bookkeeper.utils.iter_tree, in constant memory.
+
+        Only the categories on the path to the last added one are kept, so
+        the parent of every pair must be on that path, i.e. be the last added
+        category or one of its ancestors. The pairs are added with add_many
+        batch_size at a time, every batch is added as a whole or not at all.
+        To add the whole tree in one transaction, call this in a transaction
+        of the repository, e.g. with sqlite_repo.transaction().
+
+        Parameters
+        ----------
+        tree - iterable of (child-parent) pairs.
+        repo - repository to store the objects.
+        batch_size - number of categories per add_many call.
+
+        Returns
+        -------
+        Number of the added categories.
+        """
+        path: list[Category] = []
+
+        def categories() -> Iterator[Category]:
+            for child, parent in tree:
+                if parent is None:
+                    path.clear()
+                else:
+                    while path and path[-1].name != parent:
+                        path.pop()
+                    if not path:
+                        raise KeyError(parent)
+                cat = cls(child, path[-1].pk if path else None)
+                yield cat
+                path.append(cat)  # with the pk set by add_many
+
+        cats = categories()
+        added = 0
+        while pks := repo.add_many(islice(cats, batch_size)):
+            added += len(pks)
+        return added
+
+
+class CategoryTree:
+    """
+    Category hierarchy of a repository, loaded once and kept in memory.
+
+    The tree is walked once in depth-first order (an Euler tour) and every
+    category gets the interval of positions of its subtree in that order,
+    so "is a category under another one" is an O(1) interval check and the
+    descendants of a category are an O(k) slice of the order. Ancestor chains
+    are built on demand from the parent links and cached.
+
+    The tree follows the changes of the repository. New categories and
+    renames are taken in as they are; moves and deletions drop the cached
+    ancestor chains. The Euler tour is redone on the next descendant query
+    after any category is added, moved or deleted.
+
+    Children of a deleted category are treated as top-level ones. Categories
+    in a cycle of parents are left out of the depth-first order.
+    """
+
+    def __init__(self, repo: RepositoryProtocol[Category]) -> None:
+        self.repo = repo
+        self._categories: dict[int, Category] = {}
+        # pk -> parent pk as it is in the tree, the objects may be changed in place
+        self._parents: dict[int, int | None] = {}
+        self._children: dict[int | None, dict[int, None]] = defaultdict(dict)
+        self._chains: dict[int, tuple[int, ...]] = {}
+        self._order: list[int] | None = None
+        # pk -> (position in the order, end of the subtree positions)
+        self._intervals: dict[int, tuple[int, int]] = {}
+        self.reload()
+        repo.subscribe(self._on_change)
+
+    def close(self) -> None:
+        """
+        Stop following the changes of the repository.
+        """
+        self.repo.unsubscribe(self._on_change)
+
+    def reload(self) -> None:
+        """
+        Load the hierarchy from the repository from scratch.
+        """
+        self._categories.clear()
+        self._parents.clear()
+        self._children.clear()
+        self._chains.clear()
+        self._order = None
+        for cat in self.repo.get_all_where() or []:
+            self._insert(cat)
+
+    def __len__(self) -> int:
+        return len(self._categories)
+
+    def __contains__(self, pk: int) -> bool:
+        return pk in self._categories
+
+    def _insert(self, cat: Category) -> None:
+        self._categories[cat.pk] = cat
+        self._parents[cat.pk] = cat.parent
+        self._children[cat.parent][cat.pk] = None
+
+    def _remove(self, pk: int) -> None:
+        del self._categories[pk]
+        del self._children[self._parents.pop(pk)][pk]
+
+    def _on_change(self, events: Sequence[RepositoryEvent[Category]]) -> None:
+        for event in events:
+            if isinstance(event, Added):
+                self._insert(event.obj)
+                self._order = None
+            elif isinstance(event, Updated):
+                cat = event.new
+                if cat.pk in self._parents and self._parents[cat.pk] == cat.parent:
+                    self._categories[cat.pk] = cat
+                    continue
+                if cat.pk in self._parents:
+                    self._remove(cat.pk)
+                self._insert(cat)
+                self._chains.clear()
+                self._order = None
+            elif isinstance(event, Deleted):
+                if event.obj.pk in self._categories:
+                    self._remove(event.obj.pk)
+                    self._chains.clear()
+                    self._order = None
+
+    def _tour(self) -> list[int]:
+        """
+        Walk the tree in depth-first order and compute the intervals of
+        the subtrees, if it has changed since the last walk.
+        """
+        if self._order is not None:
+            return self._order
+        order: list[int] = []
+        intervals: dict[int, tuple[int, int]] = {}
+        roots = [
+            pk
+            for parent, children in self._children.items()
+            if parent is None or parent not in self._categories
+            for pk in children
+        ]
+        # (pk, True) marks the end of the subtree of pk
+        stack = [(pk, False) for pk in reversed(roots)]
+        while stack:
+            pk, leaving = stack.pop()
+            if leaving:
+                intervals[pk] = (intervals[pk][0], len(order))
+                continue
+            intervals[pk] = (len(order), 0)
+            order.append(pk)
+            stack.append((pk, True))
+            stack.extend(
+                (child, False) for child in reversed(self._children.get(pk, {}))
+            )
+        self._order, self._intervals = order, intervals
+        return order
+
+    def get(self, pk: int) -> Category | None:
+        """
+        Get a category by its pk.
+        """
+        return self._categories.get(pk)
+
+    def children(self, pk: int | None) -> list[Category]:
+        """
+        Get the direct subcategories of a category, the top-level categories
+        for None.
+        """
+        return [self._categories[child] for child in self._children.get(pk, ())]
+
+    def _chain(self, pk: int) -> tuple[int, ...]:
+        chain = self._chains.get(pk)
+        if chain is None:
+            path = []
+            parent = self._parents.get(pk)
+            while parent in self._categories and parent not in self._chains:
+                path.append(parent)
+                parent = self._parents[parent]
+                if len(path) > len(self._categories):
+                    raise ValueError(f"category {pk} has a cycle of parents")
+            if parent in self._chains:
+                chain = (*path, parent, *self._chains[parent])
+            else:
+                chain = tuple(path)
+            self._chains[pk] = chain
+        return chain
+
+    def ancestors(self, pk: int) -> list[Category]:
+        """
+        Get the parent of a category, its parent and so on up to the top.
+        """
+        return [self._categories[parent] for parent in self._chain(pk)]
+
+    def is_under(self, pk: int, ancestor: int) -> bool:
+        """
+        Check whether a category is a subcategory of another one at any level.
+        """
+        self._tour()
+        start, end = self._intervals[ancestor]
+        return start < self._intervals[pk][0] < end
+
+    def descendants(self, pk: int) -> list[Category]:
+        """
+        Get all subcategories of a category at any level, in depth-first order.
+        """
+        order = self._tour()
+        start, end = self._intervals[pk]
+        return [self._categories[child] for child in order[start + 1:end]]
+
+    def roll_up(self, totals: dict[Any, Any]) -> dict[int, Any]:
+        """
+        Get the sums of every category together with all its subcategories
+        from the sums of the categories themselves, e.g. from
+        expense_repo.sum_by("amount", group_by="category").
+        """
+        rolled = {pk: totals.get(pk, 0) for pk in self._categories}
+        # children come after their parents in the order
+        for pk in reversed(self._tour()):
+            parent = self._parents[pk]
+            if parent in rolled:
+                rolled[parent] += rolled[pk]
+        return rolled
@@ -4,6 +4,9 @@ Expense class module.
 
 from dataclasses import dataclass, field
 from datetime import datetime
+from typing import ClassVar
+
+from bookkeeper.models.money import Money
 
 
 @dataclass(slots=True)
@@ -11,15 +14,21 @@ class Expense:
     """
     Expense operation.
 
-    amount - expense sum
+    amount - expense sum in minor units, an int is taken as Money
     category - expense Category id
     expense_date - the date that expense happened
     comment - additional info on the expense
     pk - id for the repo
+    indexed_fields - fields that repositories should index
     """
 
-    amount: int
+    indexed_fields: ClassVar[tuple[str, ...]] = ("category", "expense_date")
+
+    amount: Money
     category: int
     expense_date: datetime = field(default_factory=datetime.now)
     comment: str = ""
     pk: int = 0
+
+    def __post_init__(self) -> None:
+        self.amount = Money(self.amount)
@@ -0,0 +1,94 @@
+"""
+Money class module.
+"""
+
+from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
+from typing import Any
+
+
+class Money(int):
+    """
+    Fixed-point sum of money, an integer number of minor units (kopecks, cents).
+
+    Money is an int, so sums and comparisons are exact and repositories store it
+    as an integer. Adding, subtracting and multiplying by ints gives Money,
+    anything else (e.g. division) gives what int would.
+
+    Money(1250) is 12.50, use Money.parse("12.50") to read a sum in major units.
+    """
+
+    MINOR_UNITS = 100
+    _EXPONENT = Decimal("0.01")
+
+    def __new__(cls, minor: int = 0) -> "Money":
+        if not isinstance(minor, int):
+            raise TypeError(
+                f"Money takes an int of minor units, not {type(minor).__name__}, "
+                "use Money.parse for sums in major units"
+            )
+        return super().__new__(cls, minor)
+
+    @classmethod
+    def parse(cls, value: str | int | float | Decimal) -> "Money":
+        """
+        Get the Money of a sum in major units, e.g. "12.50", 12.5 or 12.
+        Fractions of minor units are rounded half to even.
+        Raises ValueError if the value isn't a finite number.
+        """
+        if isinstance(value, str):
+            value = value.strip().replace(",", ".")
+        try:
+            units = Decimal(str(value) if isinstance(value, float) else value)
+            minor = units.quantize(cls._EXPONENT, ROUND_HALF_EVEN) * cls.MINOR_UNITS
+            return cls(int(minor))
+        except (InvalidOperation, ValueError) as exc:
+            raise ValueError(f"{value!r} is not a sum of money") from exc
+
+    def to_decimal(self) -> Decimal:
+        """
+        Get the sum in major units.
+        """
+        return Decimal(int(self)) / self.MINOR_UNITS
+
+    def __str__(self) -> str:
+        sign = "-" if self < 0 else ""
+        units, minor = divmod(abs(int(self)), self.MINOR_UNITS)
+        return f"{sign}{units}.{minor:02d}"
+
+    def __repr__(self) -> str:
+        return f"Money({str(self)!r})"
+
+    def __format__(self, format_spec: str) -> str:
+        if not format_spec:
+            return str(self)
+        return format(self.to_decimal(), format_spec)
+
+    @staticmethod
+    def _wrap(result: Any) -> Any:
+        if isinstance(result, int) and not isinstance(result, bool):
+            return Money(result)
+        return result
+
+    def __add__(self, other: Any) -> Any:
+        return self._wrap(int.__add__(self, other))
+
+    def __radd__(self, other: Any) -> Any:
+        return self._wrap(int.__radd__(self, other))
+
+    def __sub__(self, other: Any) -> Any:
+        return self._wrap(int.__sub__(self, other))
+
+    def __rsub__(self, other: Any) -> Any:
+        return self._wrap(int.__rsub__(self, other))
+
+    def __mul__(self, other: Any) -> Any:
+        return self._wrap(int.__mul__(self, other))
+
+    def __rmul__(self, other: Any) -> Any:
+        return self._wrap(int.__rmul__(self, other))
+
+    def __neg__(self) -> "Money":
+        return Money(-int(self))
+
+    def __abs__(self) -> "Money":
+        return Money(abs(int(self)))
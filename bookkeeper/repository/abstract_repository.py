@@ -10,7 +10,18 @@ the pk attribute and should not use it otherwise.
 """
 
 from abc import abstractmethod
-from typing import TypeVar, Protocol, Any, runtime_checkable
+from typing import (
+    TypeVar,
+    Protocol,
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    runtime_checkable,
+)
+
+from bookkeeper.repository.events import Listener
+from bookkeeper.repository.query import Period, Query
 
 
 class KeyObject(Protocol):  # pylint: disable=too-few-public-methods
@@ -24,16 +35,45 @@ class KeyObject(Protocol):  # pylint: disable=too-few-public-methods
 T = TypeVar("T", bound=KeyObject)
 
 
+def add_each(
+    objs: Iterable[T], add: Callable[[T], Any], undo: Callable[[list[T]], Any]
+) -> list[T]:
+    """
+    Add objects one at a time for add_many of a repository that keeps them
+    in Python. If anything is raised, undo is called with the objects that
+    were added, their pks are reset and the exception is raised again.
+    """
+    added: list[T] = []
+    try:
+        for obj in objs:
+            add(obj)
+            added.append(obj)
+    except BaseException:
+        undo(added)
+        for obj in added:
+            obj.pk = 0
+        raise
+    return added
+
+
 @runtime_checkable
 class RepositoryProtocol(Protocol[T]):
     """
     Repository protocol
     Methods:
     add
+    add_many
     get
     get_all
+    iter_where
+    find
+    sum_by
     update
+    update_many
     delete
+    delete_many
+    subscribe
+    unsubscribe
     """
 
     @abstractmethod
@@ -42,6 +82,14 @@ class RepositoryProtocol(Protocol[T]):
         Add an object to the repo and return its id.
         """
 
+    @abstractmethod
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Add several objects to the repo at once and return their ids.
+        Objects are consumed in order and each one gets its pk before the next
+        one is taken from objs. Either all objects are added or none.
+        """
+
     @abstractmethod
     def get(self, pk: int) -> T | None:
         """
@@ -53,7 +101,39 @@ class RepositoryProtocol(Protocol[T]):
         """
         Get all entries that satisfy all "where" conditions, return all
         entris if where is None.
-        where is a dictionary {"entry_field": value}
+        where is a dictionary {"entry_field": value or Condition}, plain values
+        are compared for equality, see the query module for other conditions.
+        """
+
+    @abstractmethod
+    def iter_where(
+        self, where: dict[str, Any] | None = None, batch_size: int = 1000
+    ) -> Iterator[T]:
+        """
+        Iterate over the entries that satisfy all "where" conditions, as in
+        get_all_where, without loading them all into memory at once.
+        batch_size is a hint of how many entries to load at a time.
+        """
+
+    @abstractmethod
+    def find(self, query: Query) -> list[Any]:
+        """
+        Get entries that satisfy the query conditions, ordered and paged as
+        the query asks. Return tuples of the query columns if there are any.
+        """
+
+    @abstractmethod
+    def sum_by(
+        self,
+        field: str,
+        group_by: str | Period | None = None,
+        where: dict[str, Any] | None = None,
+    ) -> dict[Any, Any]:
+        """
+        Sum a field of the entries that satisfy all "where" conditions,
+        grouped by another field or by a Period of a date field.
+        Return a dictionary {group: sum}, without grouping the only group
+        is None. Groups with no entries are left out.
         """
 
     @abstractmethod
@@ -62,8 +142,33 @@ class RepositoryProtocol(Protocol[T]):
         Update an entry with the same pk as the object.
         """
 
+    @abstractmethod
+    def update_many(self, objs: Iterable[T]) -> None:
+        """
+        Update several entries at once, either all of them or none.
+        """
+
     @abstractmethod
     def delete(self, pk: int) -> None:
         """
         Remove an entry.
         """
+
+    @abstractmethod
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """
+        Remove several entries at once, either all of them or none.
+        """
+
+    @abstractmethod
+    def subscribe(self, listener: Listener[T]) -> None:
+        """
+        Call the listener with a list of Added, Updated and Deleted events
+        after every change of the repository.
+        """
+
+    @abstractmethod
+    def unsubscribe(self, listener: Listener[T]) -> None:
+        """
+        Stop calling the listener.
+        """
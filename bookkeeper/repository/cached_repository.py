@@ -0,0 +1,232 @@
+"""
+A module for a caching wrapper of repositories.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from time import monotonic
+from typing import Any, Callable, Generic, Iterable, Iterator
+
+from bookkeeper.repository.abstract_repository import RepositoryProtocol, T
+from bookkeeper.repository.events import Listener
+from bookkeeper.repository.query import Period, Query
+
+
+@dataclass(slots=True)
+class CacheStats:
+    """
+    Counters of a cache.
+
+    hits - lookups served from the cache
+    misses - lookups passed on to the repository
+    evictions - entries dropped to make room or because they expired
+    """
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Share of the lookups served from the cache.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class CachedRepository(Generic[T]):
+    """
+    Repository wrapper that keeps the objects returned by get in a bounded
+    LRU cache, e.g. for categories that are looked up over and over by
+    Category.get_parent.
+
+    At most maxsize objects are kept, the least recently used one is dropped
+    to make room for a new one. With a ttl an object is taken from the
+    repository again when it was cached more than ttl seconds ago.
+
+    Updates and deletions made through the wrapper drop the changed entries,
+    the rest of the calls are passed on to the repository as they are.
+    Changes made to the repository some other way are seen only when the
+    entries expire or after cache_clear(). Cached objects are shared, as
+    the objects of a MemoryRepository are.
+
+    Objects read inside transaction() of the wrapper may be rolled back, so
+    they aren't cached until the transaction ends.
+    """
+
+    def __init__(
+        self,
+        repo: RepositoryProtocol[T],
+        maxsize: int = 1024,
+        ttl: float | None = None,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError("the cache must have room for at least one object")
+        self.repo = repo
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        # pk -> object, least recently used first
+        self._cache: OrderedDict[int, T] = OrderedDict()
+        # pk -> time the object expires at, with a ttl only
+        self._expires: dict[int, float] = {}
+        # number of transactions entered through the wrapper and not left yet
+        self._transactions = 0
+        self.stats = CacheStats()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __getattr__(self, name: str) -> Any:
+        # close(), interrupt() etc. of the repository
+        if name == "repo":
+            raise AttributeError(name)
+        return getattr(self.repo, name)
+
+    def cache_clear(self) -> None:
+        """
+        Drop all cached objects, the statistics are kept.
+        """
+        self._cache.clear()
+        self._expires.clear()
+
+    @contextmanager
+    def transaction(self, *args: Any, **kwargs: Any) -> Iterator[Any]:
+        """
+        Run a transaction of the repository (see its transaction()), nothing
+        is cached while it runs.
+        """
+        self._transactions += 1
+        try:
+            with getattr(self.repo, "transaction")(*args, **kwargs) as con:
+                yield con
+        finally:
+            self._transactions -= 1
+
+    def _invalidate(self, pks: Iterable[int]) -> None:
+        for pk in pks:
+            self._cache.pop(pk, None)
+            self._expires.pop(pk, None)
+
+    def get(self, pk: int) -> T | None:
+        """
+        Get an object with a fixed id, from the cache if it's there.
+        """
+        cache = self._cache
+        obj = cache.get(pk)
+        if obj is not None:
+            # the clock is read only with a ttl
+            if self.ttl is None or self._expires[pk] > self._clock():
+                cache.move_to_end(pk)
+                self.stats.hits += 1
+                return obj
+            self._invalidate([pk])
+            self.stats.evictions += 1
+        self.stats.misses += 1
+        obj = self.repo.get(pk)
+        if obj is not None and not self._transactions:
+            cache[pk] = obj
+            if self.ttl is not None:
+                self._expires[pk] = self._clock() + self.ttl
+            if len(cache) > self.maxsize:
+                oldest, _ = cache.popitem(last=False)
+                self._expires.pop(oldest, None)
+                self.stats.evictions += 1
+        return obj
+
+    def add(self, obj: T) -> int:
+        """
+        Add an object to the repo and return its id.
+        """
+        return self.repo.add(obj)
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Add several objects to the repo at once and return their ids.
+        """
+        return self.repo.add_many(objs)
+
+    def get_all_where(self, where: dict[str, Any] | None = None) -> list[T]:
+        """
+        Get all entries that satisfy all "where" conditions from the repository.
+        """
+        return self.repo.get_all_where(where)
+
+    def iter_where(
+        self, where: dict[str, Any] | None = None, batch_size: int = 1000
+    ) -> Iterator[T]:
+        """
+        Iterate over the entries that satisfy all "where" conditions of
+        the repository.
+        """
+        return self.repo.iter_where(where, batch_size)
+
+    def find(self, query: Query) -> list[Any]:
+        """
+        Get entries of the repository that satisfy the query conditions.
+        """
+        return self.repo.find(query)
+
+    def sum_by(
+        self,
+        field: str,
+        group_by: str | Period | None = None,
+        where: dict[str, Any] | None = None,
+    ) -> dict[Any, Any]:
+        """
+        Sum a field of the entries of the repository.
+        """
+        return self.repo.sum_by(field, group_by, where)
+
+    def update(self, obj: T) -> None:
+        """
+        Update an entry with the same pk as the object.
+        """
+        try:
+            self.repo.update(obj)
+        finally:
+            self._invalidate([obj.pk])
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """
+        Update several entries at once, either all of them or none.
+        """
+        objs = list(objs)
+        try:
+            self.repo.update_many(objs)
+        finally:
+            self._invalidate(obj.pk for obj in objs)
+
+    def delete(self, pk: int) -> None:
+        """
+        Remove an entry.
+        """
+        try:
+            self.repo.delete(pk)
+        finally:
+            self._invalidate([pk])
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """
+        Remove several entries at once, either all of them or none.
+        """
+        pks = list(pks)
+        try:
+            self.repo.delete_many(pks)
+        finally:
+            self._invalidate(pks)
+
+    def subscribe(self, listener: Listener[T]) -> None:
+        """
+        Call the listener with the changes of the repository.
+        """
+        self.repo.subscribe(listener)
+
+    def unsubscribe(self, listener: Listener[T]) -> None:
+        """
+        Stop calling the listener.
+        """
+        self.repo.unsubscribe(listener)
@@ -0,0 +1,459 @@
+"""
+A module for a column-oriented repository of expenses that works from RAM.
+"""
+
+from array import array
+from bisect import bisect_left
+from datetime import date, datetime, time, timedelta, timezone
+from itertools import compress, count, islice, repeat
+from operator import eq, ge, gt, le, lt
+from typing import Any, Callable, Iterable, Iterator
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.money import Money
+from bookkeeper.repository.abstract_repository import add_each
+from bookkeeper.repository.events import Added, Deleted, EventSource, Updated
+from bookkeeper.repository.query import (
+    Between,
+    Condition,
+    Ge,
+    Gt,
+    In,
+    Le,
+    Lt,
+    Period,
+    Query,
+    matches,
+)
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_DAY = 24 * 3600 * 10**6
+# row flags of the tombstones turned into flags of the live rows
+_LIVE = bytes([1, 0]) + bytes(254)
+_COMPARISONS: dict[type, Callable[[Any, Any], bool]] = {
+    Lt: lt,
+    Le: le,
+    Gt: gt,
+    Ge: ge,
+}
+
+
+def _to_us(value: datetime | date | str) -> int:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time())
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def _and(mask: bytes | bytearray | None, other: bytes) -> bytes | bytearray:
+    """
+    Rows that are set in both masks of 0 and 1 bytes, with one big int AND.
+    """
+    if mask is None:
+        return other
+    both = int.from_bytes(mask, "little") & int.from_bytes(other, "little")
+    return both.to_bytes(len(mask), "little")
+
+
+def _group_sums(
+    keys: Iterable[int], values: Iterable[int], mask: bytes | bytearray | None
+) -> dict[int, int]:
+    """
+    Sum the values (of the rows of the mask) by their keys.
+    """
+    if mask is not None:
+        keys = compress(keys, mask)
+    totals: dict[int, int] = {}
+    for key, value in zip(keys, values):
+        totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+class ColumnarRepository(EventSource[Expense]):
+    """
+    RAM repository of expenses that keeps every field in a column of its own
+    instead of an object per row.
+
+    Amounts (minor units), category ids, dates (microseconds since the Unix
+    epoch, naive datetimes are taken as UTC) and pks are stored in contiguous
+    arrays of 64-bit ints, 8 bytes a field. Comments are stored once in a
+    string pool, the column holds their positions in it. Deleted rows are
+    marked in a tombstone bytearray and dropped when they make up half of the
+    rows. A row takes about 41 bytes.
+
+    Filters and sums run over whole columns with map, compress and sum,
+    which loop in C. A filter makes a mask of 0 and 1 bytes, masks of several
+    conditions are combined with a big int AND. Expense objects are only
+    created by get, by iterating over the entries and by find without columns.
+
+    Categories must be int ids. The repository must not be changed while
+    iter_where is being iterated over.
+    """
+
+    fields = ("amount", "category", "expense_date", "comment")
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._counter = count(1)
+        self._pks = array("q")
+        self._amounts = array("q")
+        self._categories = array("q")
+        self._dates = array("q")
+        self._comments = array("q")
+        self._deleted = bytearray()
+        self._deleted_count = 0
+        self._strings: list[str] = []
+        self._string_ids: dict[str, int] = {}
+        self._columns = {
+            "pk": self._pks,
+            "amount": self._amounts,
+            "category": self._categories,
+            "expense_date": self._dates,
+            "comment": self._comments,
+        }
+
+    def __len__(self) -> int:
+        return len(self._pks) - self._deleted_count
+
+    def _column(self, name: str) -> array:
+        try:
+            return self._columns[name]
+        except KeyError:
+            raise ValueError(f"Expense has no field {name!r}") from None
+
+    def _string_id(self, value: str) -> int:
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self._strings)
+            self._strings.append(value)
+        return string_id
+
+    def _encode(self, name: str, value: Any) -> Any:
+        """
+        Get the value of a field as it is stored in its column.
+        """
+        if name == "expense_date":
+            return _to_us(value)
+        if name == "comment":
+            return self._string_id(value)
+        return value
+
+    def _decode(self, name: str, value: int) -> Any:
+        """
+        Get the value of a field from the value stored in its column.
+        """
+        if name == "expense_date":
+            return _EPOCH + value * _MICROSECOND
+        if name == "comment":
+            return self._strings[value]
+        if name == "amount":
+            return Money(value)
+        return value
+
+    def _build(self, row: int) -> Expense:
+        return Expense(
+            Money(self._amounts[row]),
+            self._categories[row],
+            _EPOCH + self._dates[row] * _MICROSECOND,
+            self._strings[self._comments[row]],
+            self._pks[row],
+        )
+
+    def _row(self, pk: int) -> int | None:
+        """
+        Get the row of a live entry, pks grow with the rows.
+        """
+        row = bisect_left(self._pks, pk)
+        if row < len(self._pks) and self._pks[row] == pk and not self._deleted[row]:
+            return row
+        return None
+
+    def _append(self, obj: Expense) -> None:
+        if getattr(obj, "pk", None) != 0:
+            raise ValueError(
+                f'trying to add an object {obj} with a filled "pk" attribute'
+            )
+        # convert all fields before changing any column
+        values = (
+            int(obj.amount),
+            obj.category,
+            _to_us(obj.expense_date),
+            self._string_id(obj.comment),
+        )
+        self._categories.append(values[1])
+        self._amounts.append(values[0])
+        self._dates.append(values[2])
+        self._comments.append(values[3])
+        self._deleted.append(0)
+        obj.pk = next(self._counter)
+        self._pks.append(obj.pk)
+
+    def add(self, obj: Expense) -> int:
+        """
+        Add an object to the repo and return its id.
+        """
+        return self.add_many([obj])[0]
+
+    def add_many(self, objs: Iterable[Expense]) -> list[int]:
+        """
+        Add several objects to the repo at once and return their ids.
+        Objects are consumed in order and each one gets its pk before the next
+        one is taken from objs. Either all objects are added or none.
+        """
+        start = len(self._pks)
+
+        def undo(added: list[Expense]) -> None:
+            for column in (*self._columns.values(), self._deleted):
+                del column[start:]
+            if added:
+                self._counter = count(added[0].pk)
+
+        added = add_each(objs, self._append, undo)
+        if self._listeners:
+            self._emit([Added(obj) for obj in added])
+        return [obj.pk for obj in added]
+
+    def get(self, pk: int) -> Expense | None:
+        """
+        Get and object with a fixed id.
+        """
+        row = self._row(pk)
+        return None if row is None else self._build(row)
+
+    def _condition_mask(self, name: str, condition: Any) -> bytes:
+        """
+        Get the mask of the rows whose field satisfies a condition.
+        """
+        column = self._column(name)
+        if name == "comment":
+            # check every distinct comment once
+            ids = {
+                string_id
+                for string_id, value in enumerate(self._strings)
+                if matches(value, condition)
+            }
+            return bytes(map(ids.__contains__, column))
+        if condition is None:
+            return bytes(len(column))
+        if not isinstance(condition, Condition):
+            return bytes(map(eq, column, repeat(self._encode(name, condition))))
+        if isinstance(condition, In):
+            values = frozenset(self._encode(name, value) for value in condition.values)
+            return bytes(map(values.__contains__, column))
+        if isinstance(condition, Between):
+            low = self._encode(name, condition.low)
+            high = self._encode(name, condition.high)
+            if isinstance(low, int) and isinstance(high, int):
+                return bytes(map(range(low, high + 1).__contains__, column))
+        elif isinstance(condition, (Lt, Le, Gt, Ge)):
+            value = self._encode(name, condition.value)
+            return bytes(map(_COMPARISONS[type(condition)], column, repeat(value)))
+        return bytes(condition.matches(self._decode(name, value)) for value in column)
+
+    def _mask(self, where: dict[str, Any] | None) -> bytes | bytearray | None:
+        """
+        Get the mask of the live rows that satisfy all conditions,
+        None for all rows.
+        """
+        mask: bytes | bytearray | None = (
+            self._deleted.translate(_LIVE) if self._deleted_count else None
+        )
+        for name, condition in (where or {}).items():
+            mask = _and(mask, self._condition_mask(name, condition))
+        return mask
+
+    def _rows(self, where: dict[str, Any] | None) -> Iterable[int]:
+        mask = self._mask(where)
+        rows = range(len(self._pks))
+        return rows if mask is None else compress(rows, mask)
+
+    def column(self, name: str, where: dict[str, Any] | None = None) -> array:
+        """
+        Get a copy of the stored values of a field (dates in microseconds,
+        comments as positions in the string pool) of the entries that satisfy
+        all "where" conditions, in pk order.
+        """
+        column = self._column(name)
+        mask = self._mask(where)
+        return array("q", column if mask is None else compress(column, mask))
+
+    def get_all_where(self, where: dict[str, Any] | None = None) -> list[Expense]:
+        """
+        Get all entries that satisfy all "where" conditions, return all
+        entris if where is None.
+        where is a dictionary {"entry_field": value or Condition}
+        """
+        return [self._build(row) for row in self._rows(where)]
+
+    def iter_where(
+        self, where: dict[str, Any] | None = None, batch_size: int = 1000
+    ) -> Iterator[Expense]:
+        """
+        Iterate over the entries that satisfy all "where" conditions, objects
+        are created one at a time. batch_size is ignored.
+        """
+        for row in self._rows(where):
+            yield self._build(row)
+
+    def _sort_key(self, name: str) -> Callable[[int], Any]:
+        column = self._column(name)
+        if name == "comment":
+            return lambda row: self._strings[column[row]]
+        return column.__getitem__
+
+    def find(self, query: Query) -> list[Any]:
+        """
+        Get entries that satisfy the query conditions, ordered and paged as
+        the query asks. Return tuples of the query columns if there are any.
+        Rows are sorted and paged before any object or tuple is created.
+        """
+        rows: Iterable[int] = self._rows(query.where)
+        if query.order_by:
+            rows = list(rows)
+            for name in reversed(query.order_by):
+                descending = name.startswith("-")
+                rows.sort(
+                    key=self._sort_key(name[1:] if descending else name),
+                    reverse=descending,
+                )
+        stop = None if query.limit is None else query.offset + query.limit
+        rows = islice(rows, query.offset, stop)
+        if query.columns is None:
+            return [self._build(row) for row in rows]
+        columns = [(name, self._column(name)) for name in query.columns]
+        return [
+            tuple(self._decode(name, column[row]) for name, column in columns)
+            for row in rows
+        ]
+
+    def sum_by(
+        self,
+        field: str,
+        group_by: str | Period | None = None,
+        where: dict[str, Any] | None = None,
+    ) -> dict[Any, Any]:
+        """
+        Sum a field of the entries that satisfy all "where" conditions,
+        grouped by another field or by a Period of the date field.
+        Without grouping the sum is taken by sum() over the column, periods are
+        summed by day first and then the days are added up in their periods.
+        """
+        if field not in ("pk", "amount", "category"):
+            raise ValueError(f"can't sum field {field!r} of Expense")
+        mask = self._mask(where)
+        values: Iterable[int] = self._column(field)
+        if mask is not None:
+            values = compress(values, mask)
+        totals: dict[Any, int] = {}
+        if group_by is None:
+            if len(self._pks) if mask is None else 1 in mask:
+                totals[None] = sum(values)
+        elif isinstance(group_by, Period):
+            totals = self._sum_by_period(values, group_by, mask)
+        else:
+            sums = _group_sums(self._column(group_by), values, mask)
+            totals = {self._decode(group_by, key): total for key, total in sums.items()}
+        if field == "amount":
+            return {key: Money(total) for key, total in totals.items()}
+        return totals
+
+    def _sum_by_period(
+        self, values: Iterable[int], period: Period, mask: bytes | bytearray | None
+    ) -> dict[date | None, int]:
+        """
+        Sum the values by day, then add the days up in their periods.
+        """
+        if period.field != "expense_date":
+            raise ValueError(f"field {period.field!r} of Expense is not a date")
+        days = map(int.__floordiv__, self._dates, repeat(_DAY))
+        totals: dict[date | None, int] = {}
+        for day, total in _group_sums(days, values, mask).items():
+            start = period.key(_EPOCH.date() + timedelta(days=day))
+            totals[start] = totals.get(start, 0) + total
+        return totals
+
+    def _set(self, row: int, obj: Expense) -> None:
+        self._amounts[row] = int(obj.amount)
+        self._categories[row] = obj.category
+        self._dates[row] = _to_us(obj.expense_date)
+        self._comments[row] = self._string_id(obj.comment)
+
+    def _rows_of(self, objs: list[Expense]) -> list[int]:
+        rows = []
+        for obj in objs:
+            if obj.pk == 0:
+                raise ValueError("trying to update an object with no primary key")
+            row = self._row(obj.pk)
+            if row is None:
+                raise ValueError(
+                    "trying to update an object with an unknown primary key"
+                )
+            rows.append(row)
+        return rows
+
+    def update(self, obj: Expense) -> None:
+        """
+        Update an entry with the same pk as the object.
+        """
+        self.update_many([obj])
+
+    def update_many(self, objs: Iterable[Expense]) -> None:
+        """
+        Update several entries at once, either all of them or none.
+        """
+        objs = list(objs)
+        rows = self._rows_of(objs)
+        olds = [self._build(row) for row in rows] if self._listeners else []
+        # check the values of the objects before any of them is written
+        for obj in objs:
+            _to_us(obj.expense_date)
+            array("q", [obj.amount, obj.category])
+        for row, obj in zip(rows, objs):
+            self._set(row, obj)
+        if self._listeners:
+            self._emit([Updated(old, obj) for old, obj in zip(olds, objs)])
+
+    def delete(self, pk: int) -> None:
+        """
+        Remove an entry.
+        """
+        self.delete_many([pk])
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """
+        Remove several entries at once, either all of them or none.
+        """
+        rows: dict[int, None] = {}
+        for pk in pks:
+            row = self._row(pk)
+            if row is None:
+                raise KeyError(pk)
+            rows[row] = None
+        olds = [self._build(row) for row in rows] if self._listeners else []
+        for row in rows:
+            self._deleted[row] = 1
+        self._deleted_count += len(rows)
+        if self._deleted_count * 2 > len(self._pks):
+            self.compact()
+        if self._listeners:
+            self._emit([Deleted(old) for old in olds])
+
+    def compact(self) -> None:
+        """
+        Drop the deleted rows and the comments that are no longer used.
+        """
+        live = self._deleted.translate(_LIVE)
+        for column in self._columns.values():
+            column[:] = array("q", compress(column, live))
+        strings = self._strings
+        self._strings = []
+        self._string_ids = {}
+        self._comments[:] = array(
+            "q", (self._string_id(strings[i]) for i in self._comments)
+        )
+        self._deleted = bytearray(len(self._pks))
+        self._deleted_count = 0
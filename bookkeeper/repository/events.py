@@ -0,0 +1,83 @@
+"""
+Repository change events module.
+
+Repositories notify their listeners about every change with a list of events.
+A listener is a callable that takes that list, it is called after the change
+is made. Repositories with transactions call listeners once per transaction,
+after it is committed, with all the events of the transaction, and never for
+the changes that were rolled back. Repositories don't do any extra work for
+events while nobody is subscribed.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Generic, Sequence, TypeVar
+
+E = TypeVar("E")
+
+
+@dataclass(frozen=True)
+class Added(Generic[E]):
+    """
+    An object was added to the repository, obj.pk is set.
+    """
+
+    obj: E
+
+
+@dataclass(frozen=True)
+class Updated(Generic[E]):
+    """
+    An entry was updated: old is the entry before the update (None if it
+    is unknown), new is the object it was updated with.
+    """
+
+    old: E | None
+    new: E
+
+
+@dataclass(frozen=True)
+class Deleted(Generic[E]):
+    """
+    An entry was deleted, obj is the entry as it was before the deletion.
+    """
+
+    obj: E
+
+
+RepositoryEvent = Added[E] | Updated[E] | Deleted[E]
+Listener = Callable[[Sequence[RepositoryEvent[E]]], None]
+
+
+class EventSource(Generic[E]):
+    """
+    Base class for repositories that notify listeners about changes.
+    """
+
+    def __init__(self) -> None:
+        self._listeners: list[Listener[E]] = []
+
+    def subscribe(self, listener: Listener[E]) -> None:
+        """
+        Call the listener with a list of events after every change.
+        """
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Listener[E]) -> None:
+        """
+        Stop calling the listener.
+        """
+        self._listeners.remove(listener)
+
+    def notify(self, events: Sequence[RepositoryEvent[E]]) -> None:
+        """
+        Call the listeners with the events.
+        """
+        for listener in list(self._listeners):
+            listener(events)
+
+    def _emit(self, events: Sequence[RepositoryEvent[E]]) -> None:
+        """
+        Report changes that were made, by default the listeners are notified
+        right away.
+        """
+        self.notify(events)
@@ -2,34 +2,177 @@
 A module for a repository that works from RAM.
 """
 
+import copy
+from bisect import bisect_left, bisect_right, insort
 from itertools import count
-from typing import Generic, Any
+from typing import Any, Collection, Iterable, Iterator
 
+from bookkeeper.repository.abstract_repository import T, add_each
+from bookkeeper.repository.events import (
+    Added,
+    Deleted,
+    EventSource,
+    Listener,
+    Updated,
+)
+from bookkeeper.repository.query import (
+    Between,
+    Condition,
+    Ge,
+    Gt,
+    In,
+    Le,
+    Lt,
+    Period,
+    Query,
+    apply,
+    fold_sum,
+    matches,
+)
 
-from bookkeeper.repository.abstract_repository import T
+_MISSING = object()
 
 
-class MemoryRepository(Generic[T]):
+class MemoryRepository(EventSource[T]):
     """
     RAM repository, stores data in a dictionary.
+
+    Fields listed in indexes get a hash index, which is used by get_all_where
+    for equality conditions on them instead of scanning all objects. Indexes are
+    kept up to date by add, update and delete, so an object that is already in
+    the repository should be changed through update only.
+
+    While there are listeners, a shallow copy of every stored object is kept,
+    so Updated and Deleted events carry the entries as they were before the
+    change, even if the object was changed in place.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, indexes: Iterable[str] = ()) -> None:
+        super().__init__()
         self._container: dict[int, T] = {}
         self._counter = count(1)
+        # field -> value -> pks of the objects with that value (ordered set)
+        self._indexes: dict[str, dict[Any, dict[int, None]]] = {
+            name: {} for name in indexes
+        }
+        # pk -> values of the indexed fields the object was indexed with
+        self._indexed_values: dict[int, tuple[Any, ...]] = {}
+        # field -> sorted values of its index, built on demand for range queries
+        # and kept sorted as values come and go, None if they can't be sorted
+        self._sorted: dict[str, list[Any] | None] = {}
+        # pk -> copy of the stored object, kept only while there are listeners
+        self._snapshots: dict[int, T] | None = None
 
-    def add(self, obj: T) -> int:
+    def subscribe(self, listener: Listener[T]) -> None:
+        if self._snapshots is None:
+            self._snapshots = {pk: copy.copy(obj) for pk, obj in self._container.items()}
+        super().subscribe(listener)
+
+    def unsubscribe(self, listener: Listener[T]) -> None:
+        super().unsubscribe(listener)
+        if not self._listeners:
+            self._snapshots = None
+
+    def _store(self, obj: T) -> T | None:
         """
-        Add an object to the repo and return its id.
+        Put an object with a pk into the container and the indexes, return
+        the snapshot of the entry it replaces, if there is one.
+        """
+        self._unindex(obj.pk)
+        self._container[obj.pk] = obj
+        self._index(obj)
+        if self._snapshots is None:
+            return None
+        old = self._snapshots.get(obj.pk)
+        self._snapshots[obj.pk] = copy.copy(obj)
+        return old
+
+    def _remove(self, pk: int) -> T:
         """
+        Take an entry out of the container and the indexes, return its
+        snapshot if there is one, the entry itself otherwise.
+        """
+        obj = self._container.pop(pk)
+        self._unindex(pk)
+        if self._snapshots is None:
+            return obj
+        return self._snapshots.pop(pk, obj)
+
+    def _index(self, obj: T) -> None:
+        if not self._indexes:
+            return
+        values = tuple(getattr(obj, name, _MISSING) for name in self._indexes)
+        self._indexed_values[obj.pk] = values
+        for (name, index), value in zip(self._indexes.items(), values):
+            if value not in index:
+                index[value] = {}
+                self._sort_in(name, value)
+            index[value][obj.pk] = None
+
+    def _unindex(self, pk: int) -> None:
+        values = self._indexed_values.pop(pk, None)
+        if values is None:
+            return
+        for (name, index), value in zip(self._indexes.items(), values):
+            bucket = index[value]
+            del bucket[pk]
+            if not bucket:
+                del index[value]
+                self._sort_out(name, value)
+
+    def _sort_in(self, name: str, value: Any) -> None:
+        keys = self._sorted.get(name)
+        if keys is None or value is None or value is _MISSING:
+            return
+        try:
+            insort(keys, value)
+        except TypeError:
+            self._sorted[name] = None
+
+    def _sort_out(self, name: str, value: Any) -> None:
+        keys = self._sorted.get(name)
+        if keys is None:
+            # the values that couldn't be sorted may be gone, try again on demand
+            self._sorted.pop(name, None)
+            return
+        if value is None or value is _MISSING:
+            return
+        i = bisect_left(keys, value)
+        if i < len(keys) and keys[i] == value:
+            del keys[i]
+
+    def _put(self, obj: T) -> None:
         if getattr(obj, "pk", None) != 0:
             raise ValueError(
                 f'trying to add an object {obj} with a filled "pk" attribute'
             )
-        pk = next(self._counter)
-        self._container[pk] = obj
-        obj.pk = pk
-        return pk
+        obj.pk = next(self._counter)
+        self._store(obj)
+
+    def add(self, obj: T) -> int:
+        """
+        Add an object to the repo and return its id.
+        """
+        self._put(obj)
+        if self._listeners:
+            self._emit([Added(obj)])
+        return obj.pk
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Add several objects to the repo at once and return their ids.
+        Objects are consumed in order and each one gets its pk before the next
+        one is taken from objs. Either all objects are added or none.
+        """
+
+        def undo(added: list[T]) -> None:
+            for obj in added:
+                self._remove(obj.pk)
+
+        added = add_each(objs, self._put, undo)
+        if self._listeners:
+            self._emit([Added(obj) for obj in added])
+        return [obj.pk for obj in added]
 
     def get(self, pk: int) -> T | None:
         """
@@ -37,19 +180,115 @@ class MemoryRepository(Generic[T]):
         """
         return self._container.get(pk)
 
+    def _sorted_keys(self, attr: str) -> list[Any] | None:
+        """
+        Sorted values of an indexed field, None if they can't be sorted.
+        """
+        if attr not in self._sorted:
+            keys = [k for k in self._indexes[attr] if k is not None and k is not _MISSING]
+            try:
+                keys.sort()
+            except TypeError:
+                self._sorted[attr] = None
+            else:
+                self._sorted[attr] = keys
+        return self._sorted[attr]
+
+    def _lookup(self, attr: str, condition: Any) -> Collection[int] | None:
+        """
+        Get pks of the objects that satisfy a condition on an indexed field
+        from its index, None if the index can't be used for the condition.
+        """
+        index = self._indexes[attr]
+        if not isinstance(condition, Condition):
+            return index.get(condition, {})
+        if isinstance(condition, In):
+            keys: Iterable[Any] = condition.values
+        else:
+            sorted_keys = self._sorted_keys(attr)
+            if sorted_keys is None:
+                return None
+            if isinstance(condition, Between):
+                start = bisect_left(sorted_keys, condition.low)
+                stop = bisect_right(sorted_keys, condition.high)
+            elif isinstance(condition, Lt):
+                start, stop = 0, bisect_left(sorted_keys, condition.value)
+            elif isinstance(condition, Le):
+                start, stop = 0, bisect_right(sorted_keys, condition.value)
+            elif isinstance(condition, Gt):
+                start, stop = bisect_right(sorted_keys, condition.value), None
+            elif isinstance(condition, Ge):
+                start, stop = bisect_left(sorted_keys, condition.value), None
+            else:
+                return None
+            keys = sorted_keys[start:stop]
+        pks: set[int] = set()
+        for key in keys:
+            pks.update(index.get(key, ()))
+        return pks
+
+    def _select(self, where: dict[str, Any] | None) -> Iterable[T]:
+        """
+        Iterate over the objects that satisfy the conditions in insertion order.
+        """
+        if not where:
+            return self._container.values()
+        candidates: Iterable[T] = self._container.values()
+        smallest: Collection[int] | None = None
+        for attr, condition in where.items():
+            if attr not in self._indexes:
+                continue
+            pks = self._lookup(attr, condition)
+            if pks is not None and (smallest is None or len(pks) < len(smallest)):
+                smallest = pks
+        if smallest is not None:
+            # check the rest of the conditions only for the smallest candidate set,
+            # pks grow with insertion, so sorting them keeps the insertion order
+            candidates = (self._container[pk] for pk in sorted(smallest))
+        return (
+            obj
+            for obj in candidates
+            if all(matches(getattr(obj, attr), value) for attr, value in where.items())
+        )
+
     def get_all_where(self, where: dict[str, Any] | None = None) -> list[T]:
         """
         Get all entries that satisfy all "where" conditions, return all
         entris if where is None.
-        where is a dictionary {"entry_field": value}
+        where is a dictionary {"entry_field": value or Condition}
         """
-        if where is None:
-            return list(self._container.values())
-        return [
-            obj
-            for obj in self._container.values()
-            if all(getattr(obj, attr) == value for attr, value in where.items())
-        ]
+        return list(self._select(where))
+
+    def iter_where(
+        self, where: dict[str, Any] | None = None, batch_size: int = 1000
+    ) -> Iterator[T]:
+        """
+        Iterate over the entries that satisfy all "where" conditions without
+        copying them into a list. The repository must not be changed until
+        the iteration is over. batch_size is ignored.
+        """
+        yield from self._select(where)
+
+    def find(self, query: Query) -> list[Any]:
+        """
+        Get entries that satisfy the query conditions, ordered and paged as
+        the query asks. Return tuples of the query columns if there are any.
+        Range and IN conditions on indexed fields use the sorted index values.
+        """
+        return apply(self._select(query.where), query)
+
+    def sum_by(
+        self,
+        field: str,
+        group_by: str | Period | None = None,
+        where: dict[str, Any] | None = None,
+    ) -> dict[Any, Any]:
+        """
+        Sum a field of the entries that satisfy all "where" conditions,
+        grouped by another field or by a Period of a date field, in a single
+        pass over the entries.
+        """
+        return fold_sum(self._select(where), field, group_by)
 
     def update(self, obj: T) -> None:
         """
@@ -57,10 +296,37 @@ class MemoryRepository(Generic[T]):
         """
         if obj.pk == 0:
             raise ValueError("trying to update an object with an unknown primary key")
-        self._container[obj.pk] = obj
+        old = self._store(obj)
+        if self._listeners:
+            self._emit([Updated(old, obj)])
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """
+        Update several entries at once, either all of them or none.
+        """
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError("trying to update an object with an unknown primary key")
+        events = [Updated(self._store(obj), obj) for obj in objs]
+        if self._listeners:
+            self._emit(events)
 
     def delete(self, pk: int) -> None:
         """
         Remove an entry.
         """
-        self._container.pop(pk)
+        obj = self._remove(pk)
+        if self._listeners:
+            self._emit([Deleted(obj)])
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """
+        Remove several entries at once, either all of them or none.
+        """
+        pks = list(pks)
+        for pk in pks:
+            if pk not in self._container:
+                raise KeyError(pk)
+        events = [Deleted(self._remove(pk)) for pk in pks if pk in self._container]
+        if self._listeners:
+            self._emit(events)
@@ -0,0 +1,309 @@
+"""
+Query conditions module.
+
+A "where" dictionary of a repository maps entry fields to conditions. A plain
+value means equality (None matches empty fields), other comparisons are
+expressed with Condition objects, e.g.
+
+    repo.get_all_where({"category": 5, "comment": Like("%milk%")})
+
+Every condition knows how to test a value in Python (for in-memory
+repositories) and how to render itself as an SQL predicate. As in SQL, only
+equality matches None, comparisons and patterns don't.
+
+Sums are grouped by a field or by calendar periods of a date field, e.g.
+
+    repo.sum_by("amount", group_by=Period("expense_date", "week"))
+
+A Query adds ordering, paging and projection to the conditions, e.g.
+
+    repo.find(Query(
+        where={"expense_date": Between(start, end)},
+        order_by=("-amount",),
+        limit=10,
+        columns=("amount", "category"),
+    ))
+"""
+
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Any, Iterable
+
+
+class Condition(ABC):
+    """
+    A condition on a single entry field.
+    """
+
+    @abstractmethod
+    def matches(self, value: Any) -> bool:
+        """
+        Check if a field value satisfies the condition.
+        """
+
+    @abstractmethod
+    def sql(self, column: str) -> tuple[str, list[Any]]:
+        """
+        Render the condition for a column as an SQL predicate with "?" marks
+        and return it along with the values for the marks.
+        """
+
+
+@dataclass(frozen=True)
+class Like(Condition):
+    """
+    SQL LIKE pattern: "%" matches any string, "_" matches any character,
+    the comparison is case-insensitive for ASCII letters.
+    """
+
+    pattern: str
+    _regex: re.Pattern[str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        regex = "".join(
+            ".*" if char == "%" else "." if char == "_" else re.escape(char)
+            for char in self.pattern
+        )
+        object.__setattr__(
+            self, "_regex", re.compile(regex, re.IGNORECASE | re.ASCII | re.DOTALL)
+        )
+
+    def matches(self, value: Any) -> bool:
+        return value is not None and self._regex.fullmatch(str(value)) is not None
+
+    def sql(self, column: str) -> tuple[str, list[Any]]:
+        return f"{column} LIKE ?", [self.pattern]
+
+
+@dataclass(frozen=True)
+class Lt(Condition):
+    """
+    Field value is less than the given one.
+    """
+
+    value: Any
+
+    def matches(self, value: Any) -> bool:
+        return value is not None and bool(value < self.value)
+
+    def sql(self, column: str) -> tuple[str, list[Any]]:
+        return f"{column} < ?", [self.value]
+
+
+@dataclass(frozen=True)
+class Le(Condition):
+    """
+    Field value is less than or equal to the given one.
+    """
+
+    value: Any
+
+    def matches(self, value: Any) -> bool:
+        return value is not None and bool(value <= self.value)
+
+    def sql(self, column: str) -> tuple[str, list[Any]]:
+        return f"{column} <= ?", [self.value]
+
+
+@dataclass(frozen=True)
+class Gt(Condition):
+    """
+    Field value is greater than the given one.
+    """
+
+    value: Any
+
+    def matches(self, value: Any) -> bool:
+        return value is not None and bool(value > self.value)
+
+    def sql(self, column: str) -> tuple[str, list[Any]]:
+        return f"{column} > ?", [self.value]
+
+
+@dataclass(frozen=True)
+class Ge(Condition):
+    """
+    Field value is greater than or equal to the given one.
+    """
+
+    value: Any
+
+    def matches(self, value: Any) -> bool:
+        return value is not None and bool(value >= self.value)
+
+    def sql(self, column: str) -> tuple[str, list[Any]]:
+        return f"{column} >= ?", [self.value]
+
+
+@dataclass(frozen=True)
+class Between(Condition):
+    """
+    Field value lies in a range, both ends included.
+    """
+
+    low: Any
+    high: Any
+
+    def matches(self, value: Any) -> bool:
+        return value is not None and bool(self.low <= value <= self.high)
+
+    def sql(self, column: str) -> tuple[str, list[Any]]:
+        return f"{column} BETWEEN ? AND ?", [self.low, self.high]
+
+
+@dataclass(frozen=True)
+class In(Condition):
+    """
+    Field value is one of the given ones.
+    """
+
+    values: tuple[Any, ...]
+
+    def __init__(self, values: Iterable[Any]) -> None:
+        object.__setattr__(self, "values", tuple(values))
+
+    def matches(self, value: Any) -> bool:
+        return value is not None and value in self.values
+
+    def sql(self, column: str) -> tuple[str, list[Any]]:
+        if not self.values:
+            return "0", []
+        return f"{column} IN ({', '.join('?' * len(self.values))})", list(self.values)
+
+
+@dataclass(frozen=True)
+class Query:
+    """
+    Repository query.
+
+    where - conditions, as in get_all_where
+    order_by - fields to sort by, a field with a "-" prefix is sorted
+    in descending order; empty fields go first in ascending order
+    limit - maximal number of results, None for no limit
+    offset - number of results to skip
+    columns - fields to return instead of the whole objects, the results
+    are tuples of their values then ("pk" is a field too)
+    """
+
+    where: dict[str, Any] | None = None
+    order_by: tuple[str, ...] = ()
+    limit: int | None = None
+    offset: int = 0
+    columns: tuple[str, ...] | None = None
+
+
+@dataclass(frozen=True)
+class Period:
+    """
+    Grouping of a date field by calendar periods: "day", "week" (weeks start
+    on Monday) or "month". A group is keyed by the first day of its period.
+    """
+
+    field: str
+    unit: str = "day"
+
+    def __post_init__(self) -> None:
+        if self.unit not in ("day", "week", "month"):
+            raise ValueError(f"unknown period {self.unit!r}")
+
+    def key(self, value: date | str | None) -> date | None:
+        """
+        Get the first day of the period a date (or a datetime, or an ISO
+        formatted date string) belongs to, None for no date.
+        """
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = date.fromisoformat(value[:10])
+        elif isinstance(value, datetime):
+            value = value.date()
+        if self.unit == "week":
+            return value - timedelta(days=value.weekday())
+        if self.unit == "month":
+            return value.replace(day=1)
+        return value
+
+    def sql(self, time_value: str) -> str:
+        """
+        Render the first day of the period of an SQLite time value (a column,
+        possibly followed by modifiers, e.g. "col, 'unixepoch'") as an SQL
+        expression.
+        """
+        if self.unit == "week":
+            # the next Sunday, or the same day for a Sunday, minus six days
+            return f"date({time_value}, 'weekday 0', '-6 days')"
+        if self.unit == "month":
+            return f"date({time_value}, 'start of month')"
+        return f"date({time_value})"
+
+
+def fold_sum(
+    objects: Iterable[Any], name: str, group_by: str | Period | None = None
+) -> dict[Any, Any]:
+    """
+    Sum a field of the objects in a single pass, grouped by a field or by
+    a Period of a date field. Without grouping the only key is None.
+    For repositories that do it in Python.
+    """
+    totals: dict[Any, Any] = {}
+    for obj in objects:
+        if group_by is None:
+            key = None
+        elif isinstance(group_by, Period):
+            key = group_by.key(getattr(obj, group_by.field))
+        else:
+            key = getattr(obj, group_by)
+        totals[key] = totals.get(key, 0) + getattr(obj, name)
+    return totals
+
+
+def _sort_key(name: str) -> Any:
+    def key(obj: Any) -> tuple[bool, Any]:
+        value = getattr(obj, name)
+        return value is not None, value
+
+    return key
+
+
+def apply(objects: Iterable[Any], query: Query) -> list[Any]:
+    """
+    Order, page and project the objects that satisfy query.where the way
+    the query asks for. For repositories that do it in Python.
+    """
+    if query.order_by:
+        ordered = list(objects)
+        # sort by the last field first, sorting is stable
+        for name in reversed(query.order_by):
+            descending = name.startswith("-")
+            ordered.sort(key=_sort_key(name.lstrip("-")), reverse=descending)
+        objects = ordered
+    stop = None if query.limit is None else query.offset + query.limit
+    page = islice(objects, query.offset, stop)
+    if query.columns is None:
+        return list(page)
+    columns = query.columns
+    return [tuple(getattr(obj, name) for name in columns) for obj in page]
+
+
+def matches(value: Any, condition: Any) -> bool:
+    """
+    Check if a field value satisfies a condition of a "where" dictionary.
+    """
+    if isinstance(condition, Condition):
+        return condition.matches(value)
+    return bool(value == condition)
+
+
+def to_sql(column: str, condition: Any) -> tuple[str, list[Any]]:
+    """
+    Render a condition of a "where" dictionary for a column as an SQL predicate
+    with "?" marks and return it along with the values for the marks.
+    """
+    if isinstance(condition, Condition):
+        return condition.sql(column)
+    if condition is None:
+        return f"{column} IS NULL", []
+    return f"{column} = ?", [condition]
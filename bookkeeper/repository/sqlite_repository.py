@@ -1,40 +1,588 @@
 """
 SQLite repository class module.
+
+Column types are derived from the annotations of the entry class: int, float
+and str fields get INTEGER, REAL and TEXT columns, datetime and date fields are
+stored as INTEGER microseconds since the Unix epoch (naive datetimes are taken
+as UTC) and Money fields as INTEGER minor units. They are converted back on
+reading by the adapters and converters registered here.
 """
 import sqlite3
+import threading
+from contextlib import AbstractContextManager, contextmanager
+from dataclasses import dataclass, fields as dataclass_fields, is_dataclass
+from datetime import date, datetime, time, timedelta, timezone
 from inspect import get_annotations
-from typing import Generic, Any
+from itertools import count
+from types import NoneType, TracebackType, UnionType
+from typing import (
+    ClassVar,
+    Any,
+    Callable,
+    Collection,
+    Iterable,
+    Iterator,
+    Sequence,
+    Union,
+    get_args,
+    get_origin,
+)
 
+from bookkeeper.models.category import Category
+from bookkeeper.models.money import Money
 from bookkeeper.repository.abstract_repository import T
+from bookkeeper.repository.events import (
+    Added,
+    Deleted,
+    EventSource,
+    RepositoryEvent,
+    Updated,
+)
+from bookkeeper.repository.query import Period, Query, to_sql
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _datetime_to_us(value: datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def _date_to_us(value: date) -> int:
+    return _datetime_to_us(datetime.combine(value, time()))
+
+
+def _us_to_datetime(value: bytes) -> datetime:
+    return _EPOCH + int(value) * _MICROSECOND
+
+
+def _us_to_date(value: bytes) -> date:
+    return _us_to_datetime(value).date()
+
+
+def _to_money(value: bytes) -> Money:
+    return Money(int(value))
+
+
+sqlite3.register_adapter(datetime, _datetime_to_us)
+sqlite3.register_adapter(date, _date_to_us)
+sqlite3.register_adapter(Money, int)
+sqlite3.register_converter("DATETIME_US", _us_to_datetime)
+sqlite3.register_converter("DATE_US", _us_to_date)
+sqlite3.register_converter("MONEY", _to_money)
+
+# declared column types, the first word picks the converter, the rest the affinity
+_COLUMN_TYPES: dict[Any, str] = {
+    bool: "INTEGER",
+    int: "INTEGER",
+    float: "REAL",
+    str: "TEXT",
+    datetime: "DATETIME_US INTEGER",
+    date: "DATE_US INTEGER",
+    Money: "MONEY INTEGER",
+}
+
+
+def column_type(type_: Any) -> str:
+    """
+    Get the declared SQLite column type for a field annotation, an empty string
+    for types with no column type. Optional types get the type of their value.
+    """
+    if get_origin(type_) in (Union, UnionType):
+        args = [arg for arg in get_args(type_) if arg is not NoneType]
+        if len(args) == 1:
+            type_ = args[0]
+    return _COLUMN_TYPES.get(type_, "")
+
+
+def _to_storage(value: Any, type_: str, old_type: str = "") -> Any:
+    """
+    Convert a value of a column of another type for a column of a declared type:
+    ISO formatted dates become microseconds, sums in major units (numbers or
+    text) become Money, the rest is left to SQLite affinity.
+    """
+    if value is None or type_ == old_type:
+        return value
+    if type_.startswith("MONEY"):
+        return Money.parse(value)
+    if not isinstance(value, str) or not type_.endswith("_US INTEGER"):
+        return value
+    try:
+        return _datetime_to_us(datetime.fromisoformat(value))
+    except ValueError as exc:
+        raise ValueError(f"can't convert {value!r} to a date") from exc
+
+
+def row_factory(entry_cls: type, fields: Sequence[str]) -> Callable[[Any, Any], Any]:
+    """
+    Generate a Cursor.row_factory that makes an entry of a row of the id and
+    the fields of an entry class, in that order.
+
+    Dataclass entries are made with positional arguments in the order of their
+    __init__, other classes with keyword arguments. Either way the code is
+    generated once, so a row costs a single call with no dictionary of fields.
+    """
+    index = {"pk": 0, **{name: i for i, name in enumerate(fields, 1)}}
+    params = []
+    if is_dataclass(entry_cls):
+        params = [field.name for field in dataclass_fields(entry_cls) if field.init]
+    if sorted(params) == sorted(index):
+        args = ", ".join(f"row[{index[name]}]" for name in params)
+    else:
+        args = ", ".join(f"{name}=row[{i}]" for name, i in index.items())
+    factory: Callable[[Any, Any], Any] = eval(  # pylint: disable=eval-used
+        f"lambda cursor, row: entry_cls({args})", {"entry_cls": entry_cls}
+    )
+    return factory
+
+
+@dataclass(frozen=True)
+class SQLiteConfig:
+    """
+    Pragmas every connection of a pool is set up with. None leaves the SQLite
+    default (or, for journal_mode, the mode the database file already has).
+
+    journal_mode - "WAL" lets readers go on while a transaction is written,
+    the rest (DELETE, TRUNCATE, PERSIST, MEMORY, OFF) lock them out
+    synchronous - OFF, NORMAL, FULL or EXTRA, how often SQLite waits for
+    the disk; with WAL, NORMAL may lose the last transactions on a power
+    loss but never corrupts the database
+    cache_size - page cache of a connection, in pages, or in KiB if negative
+    mmap_size - bytes of the database file read through memory-mapped I/O
+    temp_store - DEFAULT, FILE or MEMORY, where temporary tables and indices
+    (e.g. of ORDER BY and GROUP BY) are kept
+    busy_timeout - milliseconds to wait for a lock held by another connection
+    before raising sqlite3.OperationalError
+
+    Presets are taken by name, see PRESETS:
+    "default" - SQLite defaults, what a plain connection gets
+    "durable" - WAL with synchronous=FULL, no committed transaction is lost
+    "fast" - WAL with synchronous=NORMAL and 256 MiB of mmap, for reports
+    over large tables (a larger cache or temp_store=MEMORY make the sorts
+    of GROUP BY slower, not faster)
+    "fast-import" - WAL with a 64 MiB cache for the indices and no waiting
+    for the disk at all: an OS crash or a power loss during the import may
+    corrupt the database, so only use it for loading a database that can
+    be made again
+    """
+
+    PRESETS: ClassVar[dict[str, "SQLiteConfig"]]
+    _CHOICES: ClassVar[dict[str, tuple[str, ...]]] = {
+        "journal_mode": ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"),
+        "synchronous": ("OFF", "NORMAL", "FULL", "EXTRA"),
+        "temp_store": ("DEFAULT", "FILE", "MEMORY"),
+    }
+
+    journal_mode: str | None = None
+    synchronous: str | None = None
+    cache_size: int | None = None
+    mmap_size: int | None = None
+    temp_store: str | None = None
+    busy_timeout: int = 5000
+
+    def __post_init__(self) -> None:
+        # the values go into the text of the pragmas, so only known ones pass
+        for name, choices in self._CHOICES.items():
+            value = getattr(self, name)
+            if value is not None and (
+                not isinstance(value, str) or value.upper() not in choices
+            ):
+                raise ValueError(
+                    f"{name} must be one of {', '.join(choices)}, not {value!r}"
+                )
+        for name in ("cache_size", "mmap_size", "busy_timeout"):
+            value = getattr(self, name)
+            if value is not None and (
+                isinstance(value, bool) or not isinstance(value, int)
+            ):
+                raise ValueError(f"{name} must be an int, not {value!r}")
+        if (self.mmap_size or 0) < 0 or self.busy_timeout < 0:
+            raise ValueError("mmap_size and busy_timeout can't be negative")
+
+    @classmethod
+    def preset(cls, name: str) -> "SQLiteConfig":
+        """
+        Get a preset configuration by name.
+        """
+        try:
+            return cls.PRESETS[name]
+        except KeyError:
+            raise ValueError(
+                f"unknown preset {name!r}, use one of {', '.join(cls.PRESETS)}"
+            ) from None
+
+    def pragmas(self) -> list[str]:
+        """
+        Get the PRAGMA statements that set a connection up (but for
+        busy_timeout, which is given to sqlite3.connect).
+        """
+        return [
+            f"""PRAGMA {name} = {value}"""
+            for name in (
+                "journal_mode",
+                "synchronous",
+                "cache_size",
+                "mmap_size",
+                "temp_store",
+            )
+            if (value := getattr(self, name)) is not None
+        ]
+
+
+SQLiteConfig.PRESETS = {
+    "default": SQLiteConfig(),
+    "durable": SQLiteConfig(journal_mode="WAL", synchronous="FULL"),
+    "fast": SQLiteConfig(
+        journal_mode="WAL", synchronous="NORMAL", mmap_size=256 * 1024 * 1024
+    ),
+    "fast-import": SQLiteConfig(
+        journal_mode="WAL", synchronous="OFF", cache_size=-64 * 1024
+    ),
+}
 
 
-class SQLiteRepository(Generic[T]):
+class ConnectionPool:
+    """
+    Thread-aware pool of long-lived connections to a single database file.
+
+    Every thread gets its own connection, which is opened on first use and kept
+    until close() is called. Connection setup (pragmas) is run once per connection,
+    not once per query.
+
+    The pool is also a unit of work: repositories of different classes that share
+    a pool take part in the same transaction() of a thread, and their change
+    events are held back until it is committed.
+
+    Connections are set up with the pragmas of config, an SQLiteConfig or
+    the name of one of its presets, e.g. ConnectionPool(db_name, "fast").
+    """
+
+    def __init__(self, db_name: str, config: SQLiteConfig | str | None = None) -> None:
+        self.db_name = db_name
+        if isinstance(config, str):
+            config = SQLiteConfig.preset(config)
+        self.config = SQLiteConfig() if config is None else config
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: list[sqlite3.Connection] = []
+
+    def _connect(self) -> sqlite3.Connection:
+        # close() may be called from a thread other than the one that opened it
+        con = sqlite3.connect(
+            self.db_name,
+            check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            timeout=self.config.busy_timeout / 1000,
+        )
+        con.execute("""PRAGMA foreign_keys = ON""")
+        for pragma in self.config.pragmas():
+            con.execute(pragma)
+        return con
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Get the connection of the current thread, open it if necessary.
+        """
+        con: sqlite3.Connection | None = getattr(self._local, "connection", None)
+        if con is None:
+            con = self._connect()
+            self._local.connection = con
+            with self._lock:
+                self._connections.append(con)
+        return con
+
+    @contextmanager
+    def transaction(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        """
+        Run a block of statements of the current thread in a single transaction,
+        which is committed when the block ends and rolled back on any exception.
+
+        Nested transactions are savepoints of the outermost one: an exception
+        inside rolls back only the nested block, and nothing is committed until
+        the outermost block ends.
+
+        Parameters
+        ----------
+        immediate - lock the database for writing right away instead of
+        at the first write (only for the outermost transaction).
+
+        Yields
+        -------
+        Connection of the current thread.
+        """
+        con = self.connection()
+        depth: int = getattr(self._local, "depth", 0)
+        if depth == 0:
+            con.execute("""BEGIN IMMEDIATE""" if immediate else """BEGIN""")
+            self._local.pending = []
+        else:
+            con.execute(f"""SAVEPOINT sp{depth}""")
+        pending: list[tuple[EventSource[Any], Sequence[Any]]] = self._local.pending
+        mark = len(pending)
+        self._local.depth = depth + 1
+        try:
+            yield con
+        except BaseException:
+            del pending[mark:]
+            if depth == 0:
+                con.rollback()
+            else:
+                con.execute(f"""ROLLBACK TO sp{depth}""")
+                con.execute(f"""RELEASE sp{depth}""")
+            raise
+        else:
+            if depth == 0:
+                try:
+                    con.commit()
+                except BaseException:
+                    # e.g. a deferred constraint failed, the transaction is still open
+                    pending.clear()
+                    con.rollback()
+                    raise
+            else:
+                con.execute(f"""RELEASE sp{depth}""")
+        finally:
+            self._local.depth = depth
+        if depth == 0:
+            self._local.pending = []
+            self._deliver(pending)
+
+    def emit(self, source: EventSource[Any], events: Sequence[Any]) -> None:
+        """
+        Notify the listeners of a source about changes made by the current
+        thread when its transaction is committed, or right away if there is
+        no transaction going on.
+        """
+        if getattr(self._local, "depth", 0):
+            self._local.pending.append((source, events))
+        else:
+            source.notify(events)
+
+    @staticmethod
+    def _deliver(pending: list[tuple[EventSource[Any], Sequence[Any]]]) -> None:
+        """
+        Notify every source's listeners once with all of its events.
+        """
+        batches: dict[int, tuple[EventSource[Any], list[Any]]] = {}
+        for source, events in pending:
+            batches.setdefault(id(source), (source, []))[1].extend(events)
+        for source, events in batches.values():
+            source.notify(events)
+
+    def interrupt(self) -> None:
+        """
+        Abort the queries that are running on the connections of the pool
+        in any thread, they raise sqlite3.OperationalError.
+        """
+        with self._lock:
+            for con in self._connections:
+                con.interrupt()
+
+    def close(self) -> None:
+        """
+        Close all connections of the pool. The pool can be used again afterwards,
+        new connections are opened on demand.
+        """
+        with self._lock:
+            for con in self._connections:
+                con.close()
+            self._connections.clear()
+            self._local = threading.local()
+
+
+class SQLiteRepository(EventSource[T]):
     """
     Repository that works with an SQLite database.
+
+    The repository keeps its connections open, call close() or use it as
+    a context manager to release them.
+
+    A table made by an earlier version, with other columns or column types, is
+    rebuilt with the columns of the entry class when the repository is created.
+    Columns the entry class doesn't have are dropped only if they are listed
+    in drop_columns, otherwise the repository refuses to be created, e.g.
+    SQLiteRepository(db, Expense, drop_columns=["old_comment"]).
+
+    Fields listed in the indexed_fields class attribute of the entry class get
+    an SQL index, e.g. indexed_fields: ClassVar = ("category", "expense_date").
+
+    Every write is committed on its own unless it is made inside transaction().
+    Listeners are notified once per transaction, after it is committed.
+    To group writes to several tables, create their repositories with
+    the same pool, e.g.
+
+        pool = ConnectionPool("bookkeeper.db")
+        cat_repo = SQLiteRepository("bookkeeper.db", Category, pool)
+        exp_repo = SQLiteRepository("bookkeeper.db", Expense, pool)
+        with cat_repo.transaction():
+            cat_repo.add(cat)
+            exp_repo.add(Expense(100, cat.pk))
+
+    Connections are set up with config, an SQLiteConfig or the name of one of
+    its presets (see SQLiteConfig), e.g. SQLiteRepository(db, Expense,
+    config="fast"). A shared pool is set up with the config of the pool.
     """
 
-    def __init__(self, db_name: str, entry_cls: type) -> None:
+    def __init__(
+        self,
+        db_name: str,
+        entry_cls: type,
+        pool: ConnectionPool | None = None,
+        config: SQLiteConfig | str | None = None,
+        drop_columns: Iterable[str] = (),
+    ) -> None:
+        if pool is not None and pool.db_name != db_name:
+            raise ValueError(
+                f"pool of {pool.db_name} can't be used for a repository of {db_name}"
+            )
+        if pool is not None and config is not None:
+            raise ValueError("the config of a shared pool is given to the pool")
+        super().__init__()
         self.db_name = db_name
         self.table_name = (
             entry_cls.__name__.lower()
         )  # but what if class name is "'; DELETE FROM TABLE" 👀
-        self.fields = get_annotations(entry_cls, eval_str=True)
+        self.fields = {
+            name: type_
+            for name, type_ in get_annotations(entry_cls, eval_str=True).items()
+            if get_origin(type_) is not ClassVar
+        }
         self.fields.pop("pk")
+        self.indexed_fields: tuple[str, ...] = getattr(entry_cls, "indexed_fields", ())
         self.fields_str = ", ".join(self.fields.keys())
+        self.columns = {name: column_type(type_) for name, type_ in self.fields.items()}
         self.fields_with_marks = ", ".join([f"{name}=?" for name in self.fields.keys()])
         self.entry_cls = entry_cls
-        self._create_table()
-
-    def _create_table(self) -> None:
-        with sqlite3.connect(self.db_name) as con:
-            cur = con.cursor()
-            cur.execute(
-                f"""CREATE TABLE IF NOT EXISTS {self.table_name}(
-                'id' INTEGER UNIQUE, {self.fields_str},
+        self._row_factory = row_factory(entry_cls, list(self.fields))
+        # statements are the same text every time, with the values (pks included)
+        # as marks, so every connection compiles each of them only once
+        marks = ", ".join("?" * len(self.fields))
+        self._select_sql = f"""SELECT id, {self.fields_str} FROM {self.table_name}"""
+        self._get_sql = f"""{self._select_sql} WHERE id = ?"""
+        self._insert_sql = (
+            f"""INSERT INTO {self.table_name}({self.fields_str}) VALUES ({marks})"""
+        )
+        self._insert_with_id_sql = (
+            f"""INSERT INTO {self.table_name}(id, {self.fields_str})
+            VALUES (?, {marks})"""
+        )
+        self._update_sql = (
+            f"""UPDATE {self.table_name} SET {self.fields_with_marks} WHERE id = ?"""
+        )
+        self._delete_sql = f"""DELETE FROM {self.table_name} WHERE id = ?"""
+        self._pool = ConnectionPool(db_name, config) if pool is None else pool
+        self._create_table(drop_columns=frozenset(drop_columns))
+
+    def __enter__(self) -> "SQLiteRepository[T]":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Close all database connections of the repository. For a shared pool
+        the connections of the other repositories are closed too, they are
+        reopened on demand.
+        """
+        self._pool.close()
+
+    def interrupt(self) -> None:
+        """
+        Abort the queries of the repository's pool that are running in other
+        threads, e.g. to cancel a background load.
+        """
+        self._pool.interrupt()
+
+    def transaction(
+        self, immediate: bool = False
+    ) -> AbstractContextManager[sqlite3.Connection]:
+        """
+        Context manager that runs all writes made inside it, to this repository
+        and to the ones that share its pool, in one transaction.
+        See ConnectionPool.transaction.
+        """
+        return self._pool.transaction(immediate)
+
+    def _emit(self, events: Sequence[RepositoryEvent[T]]) -> None:
+        self._pool.emit(self, events)
+
+    def _create_table(
+        self, table_name: str | None = None, drop_columns: Collection[str] = ()
+    ) -> None:
+        columns = ", ".join(f"{name} {type_}" for name, type_ in self.columns.items())
+        with self._pool.transaction() as con:
+            con.execute(
+                f"""CREATE TABLE IF NOT EXISTS {table_name or self.table_name}(
+                'id' INTEGER UNIQUE, {columns},
                 PRIMARY KEY("id" AUTOINCREMENT)
             );"""
             )
-        con.commit()
+            if table_name is not None:
+                return
+            existing = {
+                name: type_
+                for _, name, type_, *_ in con.execute(
+                    f"""PRAGMA table_info({self.table_name})"""
+                )
+            }
+            if existing != {"id": "INTEGER", **self.columns}:
+                unknown = sorted(
+                    set(existing) - {"id"} - set(self.columns) - set(drop_columns)
+                )
+                if unknown:
+                    raise ValueError(
+                        f"table {self.table_name} has columns {unknown} that "
+                        f"{self.entry_cls.__name__} doesn't have, "
+                        "list them in drop_columns to drop them"
+                    )
+                self._migrate(con, existing)
+            for name in self.indexed_fields:
+                con.execute(
+                    f"""CREATE INDEX IF NOT EXISTS {self.table_name}_{name}_idx
+                    ON {self.table_name}({name})"""
+                )
+
+    def _migrate(self, con: sqlite3.Connection, existing: dict[str, str]) -> None:
+        """
+        Rebuild the table with the columns of the entry class, keeping the ids
+        and the values of the columns that are there in both, converted to
+        the types of the entry class.
+        """
+        new_table = f"{self.table_name}__new"
+        self._create_table(new_table)
+        kept = ["id"] + [name for name in self.columns if name in existing]
+        rows = con.execute(f"""SELECT {', '.join(kept)} FROM {self.table_name}""")
+        con.executemany(
+            f"""INSERT INTO {new_table}({', '.join(kept)})
+            VALUES ({', '.join('?' * len(kept))})""",
+            (
+                [
+                    _to_storage(value, self.columns.get(name, ""), existing[name])
+                    for name, value in zip(kept, row)
+                ]
+                for row in rows
+            ),
+        )
+        sequence = self._last_pk(con)
+        con.execute(f"""DROP TABLE {self.table_name}""")
+        con.execute(f"""ALTER TABLE {new_table} RENAME TO {self.table_name}""")
+        # keep the ids of deleted entries from being reused
+        con.execute(
+            """DELETE FROM sqlite_sequence WHERE name = ?""", [self.table_name]
+        )
+        con.execute(
+            """INSERT INTO sqlite_sequence(name, seq) VALUES (?, ?)""",
+            [self.table_name, sequence],
+        )
 
     def add(self, obj: T) -> int:
         """
@@ -42,63 +590,216 @@ class SQLiteRepository(Generic[T]):
         """
         if getattr(obj, "pk", None) != 0:
             raise ValueError(f"trying to add object {obj} with filled 'pk' attribute")
-        marks = ", ".join("?" * len(self.fields))
         values = [getattr(obj, f) for f in self.fields]
-        with sqlite3.connect(self.db_name) as con:
-            cur = con.cursor()
-            cur.execute("""PRAGMA foreign_keys = ON""")
-            cur.execute(
-                f"""INSERT INTO {self.table_name}({self.fields_str}) VALUES ({marks})""",
-                values,
-            )
+        with self._pool.transaction() as con:
+            cur = con.execute(self._insert_sql, values)
             pk = cur.lastrowid
             assert (
                 pk is not None
             )  # something must go terribly wrong for this not to be the case
             obj.pk = pk
-        con.close()
+        if self._listeners:
+            self._emit([Added(obj)])
         return obj.pk
 
-    def _covert_row(self, row_: list[str]) -> T:
-        fields = {field: entry for field, entry in zip(self.fields, row_[1:])}
-        fields["pk"] = row_[0]
-        res_obj = self.entry_cls(**fields)
-        return res_obj
+    def _last_pk(self, con: sqlite3.Connection) -> int:
+        row = con.execute(
+            """SELECT seq FROM sqlite_sequence WHERE name = ?""", [self.table_name]
+        ).fetchone()
+        return row[0] if row else 0
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Add several objects to the repo at once and return their ids.
+        Objects are consumed in order and each one gets its pk before the next
+        one is taken from objs. Either all objects are added or none.
+
+        The pks are reserved from the table sequence and the rows are inserted
+        with a single executemany call inside one transaction.
+        """
+        added: list[T] = []
+        # an object with a pk stops the rows, the error is raised after them
+        rejected: list[T] = []
+
+        def rows(pks: Iterator[int]) -> Iterator[list[Any]]:
+            for obj, pk in zip(objs, pks):
+                if getattr(obj, "pk", None) != 0:
+                    rejected.append(obj)
+                    return
+                obj.pk = pk
+                added.append(obj)
+                yield [pk] + [getattr(obj, f) for f in self.fields]
+
+        try:
+            # lock the database so that nobody takes the reserved pks
+            with self._pool.transaction(immediate=True) as con:
+                con.executemany(
+                    self._insert_with_id_sql, rows(count(self._last_pk(con) + 1))
+                )
+                if rejected:
+                    raise ValueError(
+                        f"trying to add object {rejected[0]} with filled 'pk' attribute"
+                    )
+        except BaseException:
+            for obj in added:
+                obj.pk = 0
+            raise
+        if self._listeners:
+            self._emit([Added(obj) for obj in added])
+        return [obj.pk for obj in added]
+
+    def _select(self, sql: str, parameters: Sequence[Any] = ()) -> sqlite3.Cursor:
+        """
+        Run a query of the id and the fields columns, in that order, on a cursor
+        that gives entries instead of rows.
+        """
+        cur = self._pool.connection().cursor()
+        cur.row_factory = self._row_factory
+        return cur.execute(sql, parameters)
+
+    def column_name(self, name: str) -> str:
+        """
+        Get the column of a field of the entries ("pk" is the id column).
+        Raises ValueError for fields the entry class doesn't have.
+        """
+        if name == "pk":
+            return "id"
+        if name not in self.fields:
+            raise ValueError(f"{self.entry_cls.__name__} has no field {name!r}")
+        return name
+
+    def where_clause(self, where: dict[str, Any] | None) -> tuple[str, list[Any]]:
+        """
+        Render a "where" dictionary as an SQL WHERE clause (with a leading
+        space, empty for no conditions) and its mark values, e.g. to filter
+        the entries of this table in a query of another repository.
+        """
+        if not where:
+            return "", []
+        predicates = []
+        mark_replacements: list[Any] = []
+        for name, condition in where.items():
+            predicate, values = to_sql(self.column_name(name), condition)
+            predicates.append(predicate)
+            mark_replacements += values
+        return f" WHERE {' AND '.join(predicates)}", mark_replacements
 
     def get(self, pk: int) -> T | None:
         """
         Get and object with a fixed id.
         """
-        with sqlite3.connect(self.db_name) as con:
-            cur = con.cursor()
-            row = cur.execute(
-                f"""SELECT * FROM {self.table_name} WHERE id=={pk}"""
-            ).fetchone()
-        con.close()
-        if not row:
-            return None
-        return self._covert_row(row)
+        obj: T | None = self._select(self._get_sql, [pk]).fetchone()
+        return obj
+
+    def _get_many(self, pks: Iterable[int]) -> dict[int, T]:
+        """
+        Get the objects with the given ids that exist as a dictionary {pk: obj}.
+        """
+        pks = list(pks)
+        res: dict[int, T] = {}
+        for i in range(0, len(pks), 500):
+            chunk = pks[i:i + 500]
+            objs = self._select(
+                f"""{self._select_sql} WHERE id IN ({', '.join('?' * len(chunk))})""",
+                chunk,
+            )
+            res.update((obj.pk, obj) for obj in objs)
+        return res
 
     def get_all_where(self, where: dict[str, Any] | None = None) -> list[T] | None:
         """
         Get all entries that satisfy all "where" conditions, return all
         entries if where is None.
-        where is a dictionary {"entry_field": value}
-        """
-        with sqlite3.connect(self.db_name) as con:
-            cur = con.cursor()
-            query = f"""SELECT * FROM {self.table_name}"""
-            mark_replacements = []
-            if where:
-                fields = " AND ".join([f"{name} LIKE ?" for name in where])
-                query += f" WHERE {fields}"
-                mark_replacements = list(map(str, where.values()))
-            rows = cur.execute(query, mark_replacements).fetchall()
-        con.close()
-        if rows:
-            res = [self._covert_row(row) for row in rows]
-            return res
-        return None
+        where is a dictionary {"entry_field": value or Condition}, plain values
+        are compared for equality, see the query module for other conditions.
+        """
+        where_clause, mark_replacements = self.where_clause(where)
+        res = self._select(self._select_sql + where_clause, mark_replacements)
+        return res.fetchall() or None
+
+    def iter_where(
+        self, where: dict[str, Any] | None = None, batch_size: int = 1000
+    ) -> Iterator[T]:
+        """
+        Iterate over the entries that satisfy all "where" conditions, as in
+        get_all_where. Rows are fetched batch_size at a time and objects are
+        created only when they are reached.
+        """
+        where_clause, mark_replacements = self.where_clause(where)
+        cur = self._select(self._select_sql + where_clause, mark_replacements)
+        try:
+            while objs := cur.fetchmany(batch_size):
+                yield from objs
+        finally:
+            cur.close()
+
+    def find(self, query: Query) -> list[Any]:
+        """
+        Get entries that satisfy the query conditions, ordered and paged as
+        the query asks. Return tuples of the query columns if there are any.
+        The whole query is run by SQLite.
+        """
+        if query.columns is None:
+            columns = f"id, {self.fields_str}"
+        else:
+            columns = ", ".join(self.column_name(name) for name in query.columns)
+        where_clause, mark_replacements = self.where_clause(query.where)
+        sql = f"""SELECT {columns} FROM {self.table_name}{where_clause}"""
+        if query.order_by:
+            order = ", ".join(
+                f"{self.column_name(name[1:])} DESC"
+                if name.startswith("-")
+                else self.column_name(name)
+                for name in query.order_by
+            )
+            sql += f" ORDER BY {order}"
+        if query.limit is not None or query.offset:
+            sql += " LIMIT ? OFFSET ?"
+            mark_replacements += [
+                -1 if query.limit is None else query.limit,
+                query.offset,
+            ]
+        if query.columns is None:
+            return self._select(sql, mark_replacements).fetchall()
+        return self._pool.connection().execute(sql, mark_replacements).fetchall()
+
+    def sum_by(
+        self,
+        field: str,
+        group_by: str | Period | None = None,
+        where: dict[str, Any] | None = None,
+    ) -> dict[Any, Any]:
+        """
+        Sum a field of the entries that satisfy all "where" conditions,
+        grouped by another field or by a Period of a date field.
+        The sums are computed by SQLite with SUM ... GROUP BY.
+        """
+        if group_by is None:
+            group = "NULL"
+        elif isinstance(group_by, Period):
+            time_value = self.column_name(group_by.field)
+            if self.columns.get(group_by.field, "").endswith("_US INTEGER"):
+                time_value += " / 1e6, 'unixepoch'"
+            group = group_by.sql(time_value)
+        else:
+            group = self.column_name(group_by)
+        where_clause, mark_replacements = self.where_clause(where)
+        rows = self._pool.connection().execute(
+            f"""SELECT {group}, SUM({self.column_name(field)})
+            FROM {self.table_name}{where_clause} GROUP BY 1""",
+            mark_replacements,
+        )
+        totals = dict(rows.fetchall())
+        if isinstance(group_by, Period):
+            totals = {
+                None if key is None else date.fromisoformat(key): total
+                for key, total in totals.items()
+            }
+        # the result of SUM has no declared type and isn't converted,
+        # it is NULL for a group of NULL sums only
+        if self.columns.get(field, "").startswith("MONEY"):
+            totals = {key: Money(total or 0) for key, total in totals.items()}
+        return totals
 
     def update(self, obj: T) -> None:
         """
@@ -107,25 +808,150 @@ class SQLiteRepository(Generic[T]):
         if obj.pk == 0:
             raise ValueError("trying to update an object with no primary key")
         new_values = [getattr(obj, x) for x in self.fields]
-        with sqlite3.connect(self.db_name) as con:
-            cur = con.cursor()
-            cur.execute(
-                f"""UPDATE {self.table_name} SET {self.fields_with_marks}
-                WHERE id=={obj.pk}""",
-                new_values,
-            )
+        old = self.get(obj.pk) if self._listeners else None
+        with self._pool.transaction() as con:
+            cur = con.execute(self._update_sql, new_values + [obj.pk])
             if cur.rowcount == 0:
                 raise ValueError(
                     "trying to update an object with an unknown primary key"
                 )
+        if self._listeners:
+            self._emit([Updated(old, obj)])
 
-        con.close()
+    def update_many(self, objs: Iterable[T]) -> None:
+        """
+        Update several entries at once, either all of them or none.
+        """
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError("trying to update an object with no primary key")
+        olds = self._get_many(obj.pk for obj in objs) if self._listeners else {}
+        with self._pool.transaction() as con:
+            cur = con.executemany(
+                self._update_sql,
+                ([getattr(obj, x) for x in self.fields] + [obj.pk] for obj in objs),
+            )
+            if cur.rowcount != len(objs):
+                raise ValueError(
+                    "trying to update an object with an unknown primary key"
+                )
+        if self._listeners:
+            self._emit([Updated(olds.get(obj.pk), obj) for obj in objs])
 
     def delete(self, pk: int) -> None:
         """
         Remove an entry.
         """
-        with sqlite3.connect(self.db_name) as con:
-            cur = con.cursor()
-            cur.execute(f"""DELETE FROM {self.table_name} WHERE id=={pk}""")
-        con.close()
+        old = self.get(pk) if self._listeners else None
+        with self._pool.transaction() as con:
+            con.execute(self._delete_sql, [pk])
+        if old is not None:
+            self._emit([Deleted(old)])
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """
+        Remove several entries at once, either all of them or none.
+        KeyError is raised for a pk with no entry.
+        """
+        pks = list(dict.fromkeys(pks))
+        olds = self._get_many(pks) if self._listeners else {}
+        with self._pool.transaction() as con:
+            for pk in pks:
+                if not con.execute(self._delete_sql, [pk]).rowcount:
+                    raise KeyError(pk)
+        if olds:
+            self._emit([Deleted(old) for old in olds.values()])
+
+
+class SQLiteCategoryRepository(SQLiteRepository[Category]):
+    """
+    SQLite repository of categories that walks the hierarchy inside SQLite:
+    every hierarchy query is a single WITH RECURSIVE statement, however deep
+    the tree is.
+    """
+
+    def __init__(
+        self,
+        db_name: str,
+        pool: ConnectionPool | None = None,
+        config: SQLiteConfig | str | None = None,
+    ) -> None:
+        super().__init__(db_name, Category, pool, config)
+
+    def _subtree(self) -> str:
+        """
+        A CTE of the ids of a category (the first mark) and all its
+        subcategories. UNION drops repeated ids, so a cycle of parents ends.
+        """
+        return f"""WITH RECURSIVE subtree(category_id) AS (
+            SELECT ?
+            UNION
+            SELECT c.id FROM {self.table_name} AS c
+            JOIN subtree ON c.parent = subtree.category_id
+        )"""
+
+    def ancestors(self, pk: int) -> list[Category]:
+        """
+        Get the parent of a category, its parent and so on up to the top.
+        """
+        columns = ", ".join(f"c.{name}" for name in ["id", *self.fields])
+        return self._select(
+            f"""WITH RECURSIVE chain(category_id, depth) AS (
+                SELECT parent, 1 FROM {self.table_name} WHERE id = ?
+                UNION ALL
+                SELECT c.parent, chain.depth + 1 FROM {self.table_name} AS c
+                JOIN chain ON c.id = chain.category_id
+                -- a cycle of parents can't be longer than the table
+                WHERE chain.depth <= (SELECT count(*) FROM {self.table_name})
+            )
+            SELECT {columns} FROM {self.table_name} AS c
+            JOIN chain ON c.id = chain.category_id ORDER BY chain.depth""",
+            [pk],
+        ).fetchall()
+
+    def descendants(self, pk: int) -> list[Category]:
+        """
+        Get all subcategories of a category at any level, in pk order.
+        """
+        return self._select(
+            f"""{self._subtree()}
+            {self._select_sql} WHERE id IN subtree AND id != ? ORDER BY id""",
+            [pk, pk],
+        ).fetchall()
+
+    def sum_under(
+        self,
+        pk: int,
+        expenses: SQLiteRepository[Any],
+        field: str = "amount",
+        where: dict[str, Any] | None = None,
+    ) -> Any:
+        """
+        Sum a field of the expenses of a category and all its subcategories
+        that satisfy all "where" conditions, in one SQL statement.
+        The expense repository must be of the same database and its entries
+        must have a category field of category pks.
+        """
+        if expenses.db_name != self.db_name:
+            raise ValueError(
+                f"expenses of {expenses.db_name} can't be summed with "
+                f"categories of {self.db_name}"
+            )
+        where_clause, mark_replacements = expenses.where_clause(where)
+        condition = f"{expenses.column_name('category')} IN subtree"
+        where_clause = (
+            f"{where_clause} AND {condition}" if where_clause else f" WHERE {condition}"
+        )
+        (total,) = (
+            self._pool.connection()
+            .execute(
+                f"""{self._subtree()}
+                SELECT SUM({expenses.column_name(field)})
+                FROM {expenses.table_name}{where_clause}""",
+                [pk, *mark_replacements],
+            )
+            .fetchone()
+        )
+        if expenses.columns.get(field, "").startswith("MONEY"):
+            return Money(total or 0)
+        return total or 0
@@ -4,11 +4,12 @@
 
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
+from bookkeeper.models.money import Money
 from bookkeeper.repository.memory_repository import MemoryRepository
 from bookkeeper.utils import read_tree
 
-cat_repo = MemoryRepository()
-exp_repo = MemoryRepository()
+cat_repo = MemoryRepository(indexes=Category.indexed_fields)
+exp_repo = MemoryRepository(indexes=Expense.indexed_fields)
 
 cats = """
 продукты
@@ -22,6 +23,26 @@ cats = """
 
 Category.create_from_tree(read_tree(cats), cat_repo)
 
+
+def add_expense(line: str) -> None:
+    """
+    Добавить расход из команды вида "<сумма> <категория>"
+    """
+    amount, name = line.split(maxsplit=1)
+    try:
+        cat = cat_repo.get_all_where({"name": name})[0]
+    except IndexError:
+        print(f"категория {name} не найдена")
+        return
+    try:
+        exp = Expense(Money.parse(amount), cat.pk)
+    except ValueError:
+        print(f"неверная сумма {amount}")
+        return
+    exp_repo.add(exp)
+    print(exp)
+
+
 while True:
     try:
         cmd = input("$> ")
@@ -34,12 +55,4 @@ while True:
     elif cmd == "расходы":
         print(*exp_repo.get_all_where(), sep="\n")
     elif cmd[0].isdecimal():
-        amount, name = cmd.split(maxsplit=1)
-        try:
-            cat = cat_repo.get_all_where({"name": name})[0]
-        except IndexError:
-            print(f"категория {name} не найдена")
-            continue
-        exp = Expense(int(amount), cat.pk)
-        exp_repo.add(exp)
-        print(exp)
+        add_expense(cmd)
@@ -9,11 +9,78 @@ def _get_indent(line: str) -> int:
     return len(line) - len(line.lstrip())
 
 
-def _lines_with_indent(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
-    for line in lines:
+def _lines_with_indent(lines: Iterable[str]) -> Iterator[tuple[int, int, str]]:
+    for number, line in enumerate(lines, 1):
         if not line or line.isspace():
             continue
-        yield _get_indent(line), line.strip()
+        yield number, _get_indent(line), line.strip()
+
+
+def iter_tree(
+    lines: Iterable[str], errors: list[IndentationError] | None = None
+) -> Iterator[tuple[str, str | None]]:
+    """
+    Читать структуру дерева из текста на основе отступов и выдавать пары
+    "потомок-родитель" по мере чтения, в порядке топологической сортировки.
+    Родитель элемента верхнего уровня - None.
+
+    В памяти хранится только путь от корня до текущей строки, поэтому
+    файл любого размера читается в постоянной памяти, а пары можно сразу
+    передавать в Category.create_from_tree или Category.import_tree.
+
+    Пустые строки игнорируются, номера строк в ошибках - номера строк файла,
+    начиная с 1, с учетом пустых строк.
+
+    Parameters
+    ----------
+    lines - Итерируемый объект, содержащий строки текста (файл или список строк)
+    errors - Список для ошибок. Если он не задан, первая ошибка отступа
+    выбрасывается как IndentationError. Если задан, ошибки добавляются в него,
+    а строка с неверным отступом считается потомком ближайшего внешнего уровня
+
+    Yields
+    -------
+    Пары "потомок-родитель"
+    """
+    # (отступ, имя) элементов на пути от корня, (-1, None) - над корнями
+    path: list[tuple[int, str | None]] = [(-1, None)]
+    for number, indent, name in _lines_with_indent(lines):
+        unindented = False
+        while path[-1][0] > indent:
+            path.pop()
+            unindented = True
+        if path[-1][0] == indent:
+            path.pop()
+        elif unindented:
+            error = IndentationError(
+                "unindent does not match any outer indentation level "
+                f"in line {number}",
+                (None, number, indent + 1, name),
+            )
+            if errors is None:
+                raise error
+            errors.append(error)
+        yield name, path[-1][1]
+        path.append((indent, name))
+
+
+def check_tree(lines: Iterable[str]) -> list[IndentationError]:
+    """
+    Проверить отступы всего текста дерева и вернуть все ошибки, а не только
+    первую. Номер строки ошибки - атрибут lineno.
+
+    Parameters
+    ----------
+    lines - Итерируемый объект, содержащий строки текста (файл или список строк)
+
+    Returns
+    -------
+    Список ошибок отступа, пустой, если их нет
+    """
+    errors: list[IndentationError] = []
+    for _ in iter_tree(lines, errors):
+        pass
+    return errors
 
 
 def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
@@ -32,7 +99,8 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
     [('parent', None), ('child1', 'parent'),
      ('child2', 'child1'), ('child3', 'parent')]
 
-    Пустые строки игнорируются.
+    Пустые строки игнорируются. Чтобы не хранить весь список, используйте
+    iter_tree.
 
     Parameters
     ----------
@@ -42,22 +110,4 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
     -------
     Список пар "потомок-родитель"
     """
-    parents: list[tuple[str | None, int]] = []
-    last_indent = -1
-    last_name = None
-    result: list[tuple[str, str | None]] = []
-    for i, (indent, name) in enumerate(_lines_with_indent(lines)):
-        if indent > last_indent:
-            parents.append((last_name, last_indent))
-        elif indent < last_indent:
-            while indent < last_indent:
-                _, last_indent = parents.pop()
-            if indent != last_indent:
-                raise IndentationError(
-                    f'unindent does not match any outer indentation'
-                    f'level in line {i}:\n'
-                )
-        result.append((name, parents[-1][0]))
-        last_name = name
-        last_indent = indent
-    return result
+    return list(iter_tree(lines))
@@ -0,0 +1,74 @@
+"""
+Background tasks for the GUI.
+"""
+import threading
+from typing import Any, Callable
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+
+class TaskSignals(QObject):
+    """
+    Signals of a background task, delivered in the GUI thread.
+
+    done - the result of the task, if it wasn't cancelled
+    failed - the exception the task raised, if it wasn't cancelled
+    """
+
+    done = Signal(object)
+    failed = Signal(object)
+
+
+class BackgroundTask(QRunnable):
+    """
+    A function run in the global thread pool.
+
+    The function gets the task itself and may check task.cancelled to stop
+    early. The result of a cancelled task is never delivered, it is passed
+    to discard (if given) instead, e.g. to release it.
+    """
+
+    def __init__(
+        self,
+        func: Callable[["BackgroundTask"], Any],
+        discard: Callable[[Any], None] | None = None,
+    ) -> None:
+        super().__init__()
+        self.func = func
+        self.discard = discard
+        self.signals = TaskSignals()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        """
+        Whether the task was cancelled.
+        """
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        """
+        Ask the task to stop and drop its result.
+        """
+        self._cancelled.set()
+
+    def start(self) -> "BackgroundTask":
+        """
+        Put the task into the global thread pool.
+        """
+        QThreadPool.globalInstance().start(self)
+        return self
+
+    def run(self) -> None:
+        try:
+            result = self.func(self)
+        except Exception as exc:  # pylint: disable=broad-except
+            # a cancelled task may fail because its repository was interrupted
+            if not self.cancelled:
+                self.signals.failed.emit(exc)
+            return
+        if self.cancelled:
+            if self.discard is not None:
+                self.discard(result)
+        else:
+            self.signals.done.emit(result)
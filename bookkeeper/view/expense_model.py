@@ -0,0 +1,196 @@
+"""
+Table model of the expenses for the main window.
+"""
+from bisect import bisect_left
+from operator import attrgetter
+from typing import Any, Sequence
+
+from PySide6.QtCore import (
+    QAbstractTableModel,
+    QModelIndex,
+    QPersistentModelIndex,
+    Qt,
+    Signal,
+)
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import RepositoryProtocol
+from bookkeeper.repository.events import Added, Deleted, RepositoryEvent, Updated
+from bookkeeper.repository.query import Gt, Query
+from bookkeeper.view.background import BackgroundTask
+
+ModelIndex = QModelIndex | QPersistentModelIndex
+
+
+class ExpenseTableModel(QAbstractTableModel):
+    """
+    Expenses of a repository as a table, in the order of their pks.
+
+    Rows are read from the repository a page at a time, when the view asks
+    for more of them through canFetchMore/fetchMore, i.e. when it's scrolled
+    down to the last loaded row. Nothing else is read, so opening a large
+    database costs one page. Pages are read in a background thread and
+    inserted when they arrive, the progress signal reports the number of
+    loaded rows and whether there are more of them, the failed signal
+    the exception a page load raised.
+
+    The model follows the changes of the repository: added, updated and deleted
+    expenses are inserted, changed and removed row by row.
+    """
+
+    progress = Signal(int, bool)
+    failed = Signal(object)
+
+    headers = ["pk", "Date", "amount", "Category", "Comment"]
+    fields = ["pk", "expense_date", "amount", "category", "comment"]
+
+    def __init__(
+        self, repo: RepositoryProtocol[Expense], page_size: int = 256, parent: Any = None
+    ) -> None:
+        super().__init__(parent)
+        self.repo = repo
+        self.page_size = page_size
+        self._rows: list[Expense] = []
+        self._exhausted = False
+        self._loading: BackgroundTask | None = None
+        # rows added after the last loaded one while a page was loading,
+        # by pk, the page may have been read before they were added
+        self._skipped: dict[int, Expense] = {}
+        repo.subscribe(self._on_change)
+
+    def set_repository(self, repo: RepositoryProtocol[Expense]) -> None:
+        """
+        Show the expenses of another repository, starting from its first page.
+        A page that is being loaded from the previous one is dropped.
+        """
+        self.cancel()
+        self.beginResetModel()
+        self.repo.unsubscribe(self._on_change)
+        self.repo = repo
+        self.repo.subscribe(self._on_change)
+        self._rows = []
+        self._exhausted = False
+        self.endResetModel()
+
+    def cancel(self) -> None:
+        """
+        Drop the page that is being loaded, if any.
+        """
+        if self._loading is not None:
+            self._loading.cancel()
+            self._loading = None
+        self._skipped = {}
+
+    def _find(self, pk: int) -> int | None:
+        row = bisect_left(self._rows, pk, key=attrgetter("pk"))
+        if row < len(self._rows) and self._rows[row].pk == pk:
+            return row
+        return None
+
+    def _insert(self, exp: Expense) -> None:
+        if not self._exhausted and (not self._rows or exp.pk > self._rows[-1].pk):
+            # it will come with its page, unless that page is being loaded
+            if self._loading is not None:
+                self._skipped[exp.pk] = exp
+            return
+        row = bisect_left(self._rows, exp.pk, key=attrgetter("pk"))
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._rows.insert(row, exp)
+        self.endInsertRows()
+
+    def _replace(self, exp: Expense) -> None:
+        if exp.pk in self._skipped:
+            self._skipped[exp.pk] = exp
+        row = self._find(exp.pk)
+        if row is not None:
+            self._rows[row] = exp
+            self.dataChanged.emit(
+                self.index(row, 0), self.index(row, len(self.fields) - 1)
+            )
+
+    def _remove(self, pk: int) -> None:
+        self._skipped.pop(pk, None)
+        row = self._find(pk)
+        if row is not None:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._rows[row]
+            self.endRemoveRows()
+
+    def _on_change(self, events: Sequence[RepositoryEvent[Expense]]) -> None:
+        for event in events:
+            if isinstance(event, Added):
+                self._insert(event.obj)
+            elif isinstance(event, Updated):
+                self._replace(event.new)
+            elif isinstance(event, Deleted):
+                self._remove(event.obj.pk)
+
+    def expense(self, row: int) -> Expense:
+        """
+        Get the expense shown in a row.
+        """
+        return self._rows[row]
+
+    def rowCount(self, parent: ModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent: ModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.fields)
+
+    def data(self, index: ModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        return str(getattr(self._rows[index.row()], self.fields[index.column()]))
+
+    def headerData(
+        self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole
+    ) -> Any:
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent: ModelIndex = QModelIndex()) -> bool:
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent: ModelIndex = QModelIndex()) -> None:
+        if parent.isValid() or self._exhausted or self._loading is not None:
+            return
+        # keyset paging: the next page starts after the last loaded pk
+        query = Query(
+            where={"pk": Gt(self._rows[-1].pk if self._rows else 0)},
+            order_by=("pk",),
+            limit=self.page_size,
+        )
+        repo = self.repo
+        task = BackgroundTask(lambda task: repo.find(query))
+        task.signals.done.connect(lambda page: self._add_page(task, page))
+        task.signals.failed.connect(lambda exc: self._fail(task, exc))
+        self._loading = task.start()
+
+    def _add_page(self, task: BackgroundTask, page: list[Expense]) -> None:
+        if task is not self._loading:
+            return
+        self._loading = None
+        self._exhausted = len(page) < self.page_size
+        skipped, self._skipped = self._skipped, {}
+        # rows added while the page was loading may be there already
+        if self._rows:
+            page = [exp for exp in page if exp.pk > self._rows[-1].pk]
+        if self._exhausted:
+            # the last page, the rows added while it was loading that it
+            # doesn't have won't come with another one
+            loaded = page or self._rows
+            last = loaded[-1].pk if loaded else 0
+            page += [skipped[pk] for pk in sorted(skipped) if pk > last]
+        if page:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+            self._rows.extend(page)
+            self.endInsertRows()
+        self.progress.emit(len(self._rows), not self._exhausted)
+
+    def _fail(self, task: BackgroundTask, exc: Exception) -> None:
+        if task is self._loading:
+            self._loading = None
+            self._skipped = {}
+            self.failed.emit(exc)
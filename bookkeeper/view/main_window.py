@@ -1,9 +1,9 @@
 import sys
+from PySide6.QtCore import QThreadPool
 from PySide6.QtWidgets import (
     QApplication,
     QMainWindow,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QVBoxLayout,
     QPushButton,
     QDialog,
@@ -15,10 +15,14 @@ from PySide6.QtWidgets import (
     QMessageBox,
 )
 
-from datetime import date
+from datetime import date, datetime, time
 
+from bookkeeper.budget_tracker import BudgetTracker
 from bookkeeper.models.expense import Expense
+from bookkeeper.models.money import Money
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.view.background import BackgroundTask
+from bookkeeper.view.expense_model import ExpenseTableModel
 
 
 class MyWindow(QMainWindow):
@@ -28,19 +32,22 @@ class MyWindow(QMainWindow):
         self.setGeometry(100, 100, 800, 600)
         self.setWindowTitle("My Silly Prog")
 
-        self.day_budget = 0
-        self.week_budget = 0
-        self.month_budget = 0
+        self.day_budget = Money(0)
+        self.week_budget = Money(0)
+        self.month_budget = Money(0)
 
         self.path = "../../databases/test_sql.db"
-        self.repo = SQLiteRepository(db_name=self.path, entry_cls=Expense)
-
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(
-            ["pk", "Date", "amount", "Category", "Comment"]
+        self.repo = SQLiteRepository(
+            db_name=self.path, entry_cls=Expense, config="durable"
         )
-        self.table_update()
+        self.tracker = None
+        self.totals_task = None
+
+        self.model = ExpenseTableModel(self.repo)
+        self.model.progress.connect(self.show_progress)
+        self.model.failed.connect(self.show_load_failed)
+        self.table = QTableView()
+        self.table.setModel(self.model)
 
         add_button = QPushButton("Add Row")
         add_button.clicked.connect(self.add_row)
@@ -82,7 +89,8 @@ class MyWindow(QMainWindow):
         central_widget.setLayout(main_layout)
         self.setCentralWidget(central_widget)
 
-        self.upperiodsums()
+        self.table_update()
+        self.load_totals()
 
     def add_row(self) -> None:
         dialog = QDialog(self)
@@ -118,7 +126,7 @@ class MyWindow(QMainWindow):
     ) -> None:
         try:
             periodval = date.fromisoformat(periodval)
-            summ_val = float(summ_val)
+            summ_val = Money.parse(summ_val)
             assert summ_val > 0
             assert isinstance(category_val, str)
             assert isinstance(comment_val, str)
@@ -132,54 +140,77 @@ class MyWindow(QMainWindow):
             return
 
         obj = Expense(
-            expense_date=str(periodval),
-            amount=str(summ_val),
+            expense_date=datetime.combine(periodval, time()),
+            amount=summ_val,
             category=category_val,
             comment=comment_val,
         )
 
-        self.repo.add(obj)
-
-        self.table_update()
+        self.repo.add(obj)  # the table and the tracker follow the repository
         self.upperiodsums()
 
         dialog.accept()
 
     def remove_row(self):
-        selected = self.table.currentRow()
-        print(selected)
+        selected = self.table.currentIndex().row()
         if selected != -1:
-            self.repo.delete(int(self.table.item(selected, 0).text()))
-            self.table_update()
+            self.repo.delete(self.model.expense(selected).pk)
         self.upperiodsums()
 
-    def upperiodsums(self):
-        today = date.today()
-        today_sum = 0
-        week_sum = 0
-        month_sum = 0
-
-        for row in range(self.table.rowCount()):
-            periodstr = self.table.item(row, 1).text()
-            amount_str = self.table.item(row, 2).text()
-            try:
-                amount = float(amount_str)
-            except ValueError:
-                continue
+    def show_progress(self, loaded, more):
+        self.statusBar().showMessage(
+            f"Loaded {loaded} rows" + (", scroll down for more" if more else "")
+        )
 
-            periodval = date.fromisoformat(periodstr)
+    def show_load_failed(self, exc):
+        self.statusBar().showMessage(f"Can't load the rows: {exc}")
 
-            if periodval == today:
-                today_sum += amount
+    def load_totals(self):
+        if self.totals_task is not None:
+            self.totals_task.cancel()
+        if self.tracker is not None:
+            self.tracker.close()
+            self.tracker = None
+        self.upperiodsums()
+        # the tracker follows the repository from here on, the changes made
+        # while it's being built are counted when it's done
+        tracker = BudgetTracker(self.repo, build=False)
 
-            if (
-                periodval.isocalendar()[1] == today.isocalendar()[1]
-                and periodval.year == today.year
-            ):
-                week_sum += amount
+        def build(task):
+            try:
+                tracker.rebuild(lambda: task.cancelled)
+            except Exception:
+                tracker.close()
+                raise
+            return tracker
+
+        self.totals_task = BackgroundTask(build, discard=BudgetTracker.close)
+        self.totals_task.signals.done.connect(self.set_tracker)
+        self.totals_task.signals.failed.connect(self.set_tracker_failed)
+        self.totals_task.start()
+
+    def set_tracker(self, tracker):
+        self.totals_task = None
+        self.tracker = tracker
+        self.upperiodsums()
 
-            if periodval.month == today.month and periodval.year == today.year:
-                month_sum += amount
+    def set_tracker_failed(self, exc):
+        self.totals_task = None
+        self.statusBar().showMessage(f"Can't compute the totals: {exc}")
+
+    def upperiodsums(self):
+        if self.tracker is None:
+            for label in (
+                self.today_sum_label,
+                self.week_sum_label,
+                self.month_sum_label,
+            ):
+                label.setText("...")
+                label.setStyleSheet("")
+            return
+        today_sum = self.tracker.spent("day")
+        week_sum = self.tracker.spent("week")
+        month_sum = self.tracker.spent("month")
 
         self.today_sum_label.setText(
             "{:.2f} / {:.2f}".format(today_sum, self.day_budget)
@@ -233,9 +264,9 @@ class MyWindow(QMainWindow):
 
     def submit_budget(self, dialog, day_budget, week_budget, month_budget):
         try:
-            day_budget = float(day_budget)
-            week_budget = float(week_budget)
-            month_budget = float(month_budget)
+            day_budget = Money.parse(day_budget)
+            week_budget = Money.parse(week_budget)
+            month_budget = Money.parse(month_budget)
             assert day_budget > 0
             assert week_budget > 0
             assert month_budget > 0
@@ -264,34 +295,24 @@ class MyWindow(QMainWindow):
 
         if file_name:
             self.path = file_name
-            self.repo = SQLiteRepository(db_name=self.path, entry_cls=Expense)
+            # cancel the loads from the previous file and abort its running
+            # queries, the tasks check for cancellation between their steps,
+            # so waiting for them to stop before closing it is short
+            self.model.cancel()
+            if self.totals_task is not None:
+                self.totals_task.cancel()
+            self.repo.interrupt()
+            QThreadPool.globalInstance().waitForDone()
+            self.repo.close()
+            self.repo = SQLiteRepository(
+                db_name=self.path, entry_cls=Expense, config="durable"
+            )
+            self.table_update()
+            self.load_totals()
 
     def table_update(self):
-
-        self.table.clearContents()
-        self.table.setRowCount(0)
-
-        if self.repo.get_all_where() is not None:
-            L = [
-                [str(x.pk), x.expense_date, x.amount, x.category, x.comment]
-                for x in self.repo.get_all_where()
-            ]
-            for row in L:
-                # Add new row to table
-                row_count = self.table.rowCount()
-                self.table.setRowCount(row_count + 1)
-
-                item0 = QTableWidgetItem(row[0])
-                item1 = QTableWidgetItem(row[1])
-                item2 = QTableWidgetItem(row[2])
-                item3 = QTableWidgetItem(row[3])
-                item4 = QTableWidgetItem(row[4])
-
-                self.table.setItem(row_count, 0, item0)
-                self.table.setItem(row_count, 1, item1)
-                self.table.setItem(row_count, 2, item2)
-                self.table.setItem(row_count, 3, item3)
-                self.table.setItem(row_count, 4, item4)
+        self.model.set_repository(self.repo)
+        self.model.fetchMore()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,106 @@
+"""
+Spending reports tests.
+"""
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.analytics import ExpenseColumns, Rollups, iter_columns, rollups
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.money import Money
+from bookkeeper.repository.columnar_repository import ColumnarRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Period, fold_sum
+
+EXPENSES = [
+    (100, 1, datetime(2023, 3, 1, 12)),
+    (10, 2, datetime(2023, 3, 13, 12)),
+    (1, 1, datetime(2023, 3, 14, 12)),
+    (1000, 3, datetime(2023, 4, 2, 12)),
+    (5, 2, datetime(2023, 3, 14, 8)),
+]
+
+
+@pytest.fixture(name="repo", params=[MemoryRepository, ColumnarRepository])
+def fixture_repository(request):
+    """
+    A repository of each kind with the same expenses.
+    """
+    repo = request.param()
+    repo.add_many(Expense(*fields) for fields in EXPENSES)
+    return repo
+
+
+def test_iter_columns(repo):
+    """
+    Columns should be loaded in batches, with category codes.
+    """
+    batches = list(iter_columns(repo, batch_size=2))
+    assert sum(len(batch) for batch in batches) == 5
+    columns = batches[0]
+    assert columns.days[0] == date(2023, 3, 1).toordinal()
+    assert columns.category_values[columns.categories[0]] == 1
+    assert not any(iter_columns(repo, {"category": 4}))
+
+
+def test_rollups(repo):
+    """
+    Rollups should agree with the per-row sums of the repository.
+    """
+    report = rollups(repo, batch_size=2)
+    expenses = repo.get_all_where()
+    for unit in ("day", "week", "month"):
+        assert report.by_period(unit) == fold_sum(
+            expenses, "amount", Period("expense_date", unit)
+        )
+    assert report.by_period("month") == {date(2023, 3, 1): 116, date(2023, 4, 1): 1000}
+    assert report.by_category() == {1: 101, 2: 15, 3: 1000}
+    assert report.total() == 1116
+    assert isinstance(report.total(), Money)
+    assert rollups(repo, {"category": 2}).by_category() == {2: 15}
+
+
+def test_rolling_average(repo):
+    """
+    Averages should count the periods with no expenses as zero.
+    """
+    report = rollups(repo)
+    averages = report.rolling_average(2, "week")
+    assert averages == {
+        date(2023, 2, 27): 100,
+        date(2023, 3, 6): 50,
+        date(2023, 3, 13): 8,
+        date(2023, 3, 20): 8,
+        date(2023, 3, 27): 500,
+    }
+    days = report.rolling_average(7)
+    assert len(days) == 33
+    assert days[date(2023, 3, 7)] == 14
+    assert report.rolling_average(3, "month") == {
+        date(2023, 3, 1): 116,
+        date(2023, 4, 1): 558,
+    }
+    assert Rollups().rolling_average(3) == {}
+    with pytest.raises(ValueError):
+        report.rolling_average(0)
+
+
+def test_top_categories(repo):
+    """
+    The categories with the largest sums should come first.
+    """
+    report = rollups(repo)
+    assert report.top_categories(2) == [(3, 1000), (1, 101)]
+    assert report.top_categories(10) == [(3, 1000), (1, 101), (2, 15)]
+
+
+def test_wide_batch():
+    """
+    A batch of a few expenses far apart should be summed too.
+    """
+    columns = ExpenseColumns.from_expenses(
+        [Expense(1, "a", datetime(1, 1, 1)), Expense(2, "b", datetime(9999, 1, 1))]
+    )
+    report = Rollups([columns, columns])
+    assert report.by_period("day") == {date(1, 1, 1): 2, date(9999, 1, 1): 4}
+    assert report.top_categories(1) == [("b", 4)]
@@ -0,0 +1,162 @@
+"""
+Budget tracker tests.
+"""
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.budget_tracker import BudgetTracker
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+
+@pytest.fixture(name="repo")
+def fixture_repository():
+    """
+    An expense repository with a few expenses in March 2023.
+    """
+    repo = MemoryRepository()
+    repo.add_many(
+        [
+            Expense(100, 1, datetime(2023, 3, 1, 12)),
+            Expense(10, 2, datetime(2023, 3, 13, 12)),
+            Expense(1, 1, datetime(2023, 3, 14, 12)),
+        ]
+    )
+    return repo
+
+
+@pytest.fixture(name="clock")
+def fixture_clock():
+    """
+    A settable date for the tracker to use as today.
+    """
+    return {"today": date(2023, 3, 14)}
+
+
+@pytest.fixture(name="tracker")
+def fixture_tracker(repo, clock):
+    """
+    A tracker of the repository.
+    """
+    return BudgetTracker(repo, today=lambda: clock["today"])
+
+
+def test_rebuild(tracker):
+    """
+    The counters should be built from the repository.
+    """
+    assert tracker.spent("day") == 1
+    assert tracker.spent("week") == 11
+    assert tracker.spent("month") == 111
+    assert tracker.spent("day", date(2023, 3, 1)) == 100
+    assert tracker.spent_in_category(1) == 101
+    assert tracker.spent_in_category(3) == 0
+
+
+def test_changes(repo, tracker):
+    """
+    The counters should follow additions, updates and deletions.
+    """
+    exp = Expense(1000, 3, datetime(2023, 3, 14, 15))
+    repo.add(exp)
+    assert tracker.spent("day") == 1001
+    assert tracker.spent_in_category(3) == 1000
+    repo.update(Expense(2000, 2, datetime(2023, 3, 12), pk=exp.pk))
+    assert tracker.spent("day") == 1
+    assert tracker.spent("week") == 11
+    assert tracker.spent("day", date(2023, 3, 12)) == 2000
+    assert tracker.spent_in_category(3) == 0
+    assert tracker.spent_in_category(2) == 2010
+    repo.delete_many([1, exp.pk])
+    assert tracker.spent("month") == 11
+    tracker.close()
+    repo.delete(2)
+    assert tracker.spent("month") == 11
+
+
+def test_budgets(repo, tracker, clock):
+    """
+    Budgets should be counted in their current period and switched to the next
+    one when the date changes.
+    """
+    day = Budget(50, "day")
+    month = Budget(200, "month")
+    tracker.add_budget(day)
+    tracker.add_budget(month)
+    assert day.get_spent() == 1
+    assert month.get_spent() == 111
+    assert tracker.over_budget() == []
+    repo.add(Expense(60, 1, datetime(2023, 3, 14, 18)))
+    assert day.get_spent() == 61
+    assert tracker.over_budget() == [day]
+    repo.add(Expense(60, 1, datetime(2023, 3, 2)))
+    assert day.get_spent() == 61
+    assert tracker.over_budget() == [day, month]
+    clock["today"] = date(2023, 4, 1)
+    assert tracker.over_budget() == []
+    assert day.get_spent() == month.get_spent() == 0
+    repo.add(Expense(5, 1, datetime(2023, 4, 1, 9)))
+    assert day.get_spent() == month.get_spent() == 5
+    with pytest.raises(ValueError):
+        tracker.add_budget(Budget(1, "year"))
+
+
+def test_update_in_place(repo, tracker):
+    """
+    An expense changed in place and updated should be counted with its new
+    values, though the old and the new object of the event are the same.
+    """
+    exp = repo.get(3)
+    exp.amount = 500
+    exp.category = 2
+    repo.update(exp)
+    assert tracker.spent("day") == 500
+    assert tracker.spent_in_category(1) == 100
+    assert tracker.spent_in_category(2) == 510
+    repo.delete(3)
+    assert tracker.spent("day") == 0
+    assert tracker.spent_in_category(2) == 10
+
+
+def test_changes_before_rebuild(repo, clock):
+    """
+    Changes made before and while the counters are built should be counted once.
+    """
+    tracker = BudgetTracker(repo, today=lambda: clock["today"], build=False)
+    exp = Expense(1000, 3, datetime(2023, 3, 14, 15))
+    repo.add(exp)
+    repo.delete(1)
+    assert not tracker.rebuild(cancelled=lambda: True)
+    added = []
+
+    def add_once():
+        # between the sum by days and the sum by categories
+        if not added:
+            added.append(repo.add(Expense(5, 3, datetime(2023, 3, 14, 16))))
+        return False
+
+    assert tracker.rebuild(cancelled=add_once)
+    assert tracker.spent("day") == 1006
+    assert tracker.spent("month") == 1016
+    assert tracker.spent_in_category(1) == 1
+    assert tracker.spent_in_category(3) == 1005
+    repo.update(Expense(2000, 3, datetime(2023, 3, 14, 15), pk=exp.pk))
+    assert tracker.spent("day") == 2006
+    assert tracker.spent_in_category(3) == 2005
+
+
+def test_old_periods_and_dates(repo, tracker):
+    """
+    Sums of periods before the counters start should be asked from the
+    repository, expenses dated with dates should be counted as well.
+    """
+    repo.add(Expense(7, 1, datetime(2023, 2, 28, 23)))
+    assert tracker.spent("month", date(2023, 2, 1)) == 7
+    assert tracker.spent("day", date(2023, 2, 28)) == 7
+    assert tracker.spent("week", date(2023, 2, 27)) == 107
+    assert tracker.spent("day", date(2022, 1, 1)) == 0
+    repo.add(Expense(20, 2, date(2023, 3, 14)))
+    assert tracker.spent("day") == 21
+    assert tracker.spent_in_category(2) == 30
@@ -1,13 +1,15 @@
 """
 Category class tests.
 """
+import sys
 from inspect import isgenerator
 
 import pytest
 
-from bookkeeper.models.category import Category
+from bookkeeper.models.category import Category, CategoryTree
 from bookkeeper.repository.abstract_repository import RepositoryProtocol
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.utils import iter_tree
 
 
 @pytest.fixture(name="repo")
@@ -132,3 +134,131 @@ def test_create_from_tree_error(repo: RepositoryProtocol[Category]):
     tree = [("1", "parent"), ("parent", None)]
     with pytest.raises(KeyError):
         Category.create_from_tree(tree, repo)
+
+
+@pytest.fixture(name="tree")
+def fixture_tree(repo: RepositoryProtocol[Category]):
+    """
+    A tree of categories:
+    0
+        1
+            3
+        2
+    4
+    """
+    cats = Category.create_from_tree(
+        [("0", None), ("1", "0"), ("2", "0"), ("3", "1"), ("4", None)], repo
+    )
+    return CategoryTree(repo), {c.name: c.pk for c in cats}
+
+
+def test_tree_queries(tree):
+    """
+    The tree should answer hierarchy queries.
+    """
+    tree, pks = tree
+    assert len(tree) == 5
+    assert [c.name for c in tree.ancestors(pks["3"])] == ["1", "0"]
+    assert tree.ancestors(pks["4"]) == []
+    assert [c.name for c in tree.descendants(pks["0"])] == ["1", "3", "2"]
+    assert tree.descendants(pks["2"]) == []
+    assert [c.name for c in tree.children(None)] == ["0", "4"]
+    assert tree.is_under(pks["3"], pks["0"])
+    assert not tree.is_under(pks["0"], pks["0"])
+    assert not tree.is_under(pks["3"], pks["2"])
+    assert not tree.is_under(pks["0"], pks["3"])
+    assert tree.roll_up({pks["3"]: 5, pks["2"]: 1, pks["4"]: 10}) == {
+        pks["0"]: 6,
+        pks["1"]: 5,
+        pks["2"]: 1,
+        pks["3"]: 5,
+        pks["4"]: 10,
+    }
+
+
+def test_tree_follows_repository(repo, tree):
+    """
+    The tree should be updated by the changes of the repository.
+    """
+    tree, pks = tree
+    assert [c.name for c in tree.ancestors(pks["3"])] == ["1", "0"]
+    pk5 = repo.add(Category("5", pks["3"]))
+    assert [c.name for c in tree.ancestors(pk5)] == ["3", "1", "0"]
+    assert tree.is_under(pk5, pks["0"])
+    repo.update(Category("renamed", pks["0"], pks["1"]))
+    assert [c.name for c in tree.ancestors(pk5)] == ["3", "renamed", "0"]
+    # move the subtree of 1 under 4
+    repo.update(Category("1", pks["4"], pks["1"]))
+    assert [c.name for c in tree.ancestors(pk5)] == ["3", "1", "4"]
+    assert [c.name for c in tree.descendants(pks["0"])] == ["2"]
+    assert tree.is_under(pk5, pks["4"])
+    repo.delete(pks["1"])
+    assert [c.name for c in tree.ancestors(pk5)] == ["3"]
+    assert [c.name for c in tree.children(None)] == ["0", "4"]
+    assert [c.name for c in tree.descendants(pks["3"])] == ["5"]
+    assert not tree.is_under(pk5, pks["4"])
+    tree.close()
+    repo.add(Category("6"))
+    assert len(tree) == 5
+
+
+def test_tree_cycle(repo, tree):
+    """
+    A cycle of parents should be an error, not an endless loop.
+    """
+    tree, pks = tree
+    repo.update(Category("0", pks["3"], pks["0"]))
+    with pytest.raises(ValueError):
+        tree.ancestors(pks["3"])
+    assert [c.name for c in tree.children(None)] == ["4"]
+
+
+def test_get_subcategories_order(repo: RepositoryProtocol[Category]):
+    """
+    Subcategories should come in depth-first or breadth-first order.
+    """
+    root = Category("0")
+    root_pk = repo.add(root)
+    pk1 = repo.add(Category("1", root_pk))
+    pk2 = repo.add(Category("2", root_pk))
+    repo.add(Category("3", pk1))
+    repo.add(Category("4", pk2))
+    assert [c.name for c in root.get_subcategories(repo)] == ["1", "3", "2", "4"]
+    assert [c.name for c in root.get_subcategories(repo, "bfs")] == ["1", "2", "3", "4"]
+    # the order is checked when the method is called, not when iterated
+    with pytest.raises(ValueError):
+        root.get_subcategories(repo, "random")
+
+
+def test_deep_hierarchy(repo: RepositoryProtocol[Category]):
+    """
+    Traversals should not be limited by the recursion limit.
+    """
+    depth = 5 * sys.getrecursionlimit()
+    cats = Category.create_from_tree(
+        [("0", None)] + [(str(i), str(i - 1)) for i in range(1, depth)], repo
+    )
+    assert len(list(cats[-1].get_all_parents(repo))) == depth - 1
+    assert len(list(cats[0].get_subcategories(repo))) == depth - 1
+    assert len(list(cats[0].get_subcategories(repo, "bfs"))) == depth - 1
+
+
+def test_import_tree(repo: RepositoryProtocol[Category]):
+    """
+    An indented text should be streamed into the repository in batches.
+    """
+    text = ["0", "  1", "    2", "  1", "    0", "3"] + ["  x"] * 10
+    assert Category.import_tree(iter_tree(text), repo, batch_size=3) == 16
+    cats = repo.get_all_where()
+    assert [(c.name, c.parent) for c in cats[:6]] == [
+        ("0", None),
+        ("1", 1),
+        ("2", 2),
+        ("1", 1),
+        ("0", 4),
+        ("3", None),
+    ]
+    assert {c.parent for c in cats[6:]} == {6}
+    with pytest.raises(KeyError):
+        Category.import_tree([("a", None), ("b", "c")], repo)
+    assert repo.get_all_where({"name": "b"}) == []
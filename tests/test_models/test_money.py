@@ -0,0 +1,68 @@
+"""
+Money class tests.
+"""
+from decimal import Decimal
+
+import pytest
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.money import Money
+
+
+def test_parse():
+    """
+    Sums in major units should be read as minor units.
+    """
+    assert Money.parse("12.50") == 1250
+    assert Money.parse(" 12,5 ") == 1250
+    assert Money.parse(12) == 1200
+    assert Money.parse(0.1) == 10
+    assert Money.parse(Decimal("0.125")) == 12
+    assert Money.parse("-3.07") == -307
+    for value in ["", "abc", "inf", "nan"]:
+        with pytest.raises(ValueError):
+            Money.parse(value)
+
+
+def test_only_ints():
+    """
+    Money should not silently truncate floats.
+    """
+    with pytest.raises(TypeError):
+        Money(12.5)
+    with pytest.raises(TypeError):
+        Expense(12.5, 1)
+
+
+def test_arithmetic():
+    """
+    Sums of Money should stay Money and be exact.
+    """
+    total = sum([Money.parse("0.1")] * 3)
+    assert isinstance(total, Money)
+    assert total == Money.parse("0.3")
+    assert isinstance(-2 * Money(5) - 1, Money)
+    assert isinstance(Money(5) / 2, float)
+
+
+def test_str():
+    """
+    Money should be shown in major units.
+    """
+    assert str(Money(1250)) == "12.50"
+    assert str(Money(-5)) == "-0.05"
+    assert repr(Money(1)) == "Money('0.01')"
+    assert "{:.1f}".format(Money(1250)) == "12.5"
+    assert f"{Money(7)}" == "0.07"
+
+
+def test_models():
+    """
+    Amounts of the models should be Money.
+    """
+    assert isinstance(Expense(100, 1).amount, Money)
+    bgt = Budget(1000, "day")
+    bgt.count_in(Money(100))
+    assert isinstance(bgt.amount, Money)
+    assert isinstance(bgt.get_spent(), Money)
@@ -3,6 +3,8 @@ Repository protocol class tests.
 """
 
 from bookkeeper.repository.abstract_repository import RepositoryProtocol
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.columnar_repository import ColumnarRepository
 from bookkeeper.repository.memory_repository import MemoryRepository
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
 
@@ -13,3 +15,5 @@ def test_repos_implement():
     """
     assert issubclass(MemoryRepository, RepositoryProtocol)
     assert issubclass(SQLiteRepository, RepositoryProtocol)
+    assert issubclass(ColumnarRepository, RepositoryProtocol)
+    assert issubclass(CachedRepository, RepositoryProtocol)
@@ -0,0 +1,128 @@
+"""
+Cached repository class tests.
+"""
+
+import pytest
+
+from bookkeeper.models.category import Category
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+class CountingRepository(MemoryRepository):
+    """
+    A memory repository that counts get calls.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.gets = 0
+
+    def get(self, pk):
+        self.gets += 1
+        return super().get(pk)
+
+
+@pytest.fixture(name="inner")
+def fixture_inner():
+    """
+    A repository with a chain of five categories.
+    """
+    repo = CountingRepository()
+    tree = [("0", None)] + [(str(i), str(i - 1)) for i in range(1, 5)]
+    Category.create_from_tree(tree, repo)
+    return repo
+
+
+def test_hits(inner):
+    """
+    Repeated lookups should be served from the cache.
+    """
+    repo = CachedRepository(inner)
+    bottom = repo.get(5)
+    for _ in range(3):
+        assert [c.name for c in bottom.get_all_parents(repo)] == ["3", "2", "1", "0"]
+    assert inner.gets == 5
+    assert (repo.stats.hits, repo.stats.misses) == (8, 5)
+    assert repo.stats.hit_rate == 8 / 13
+    assert repo.get(100) is None
+    assert repo.get(100) is None
+    assert repo.stats.misses == 7
+
+
+def test_lru(inner):
+    """
+    The least recently used object should be dropped first.
+    """
+    repo = CachedRepository(inner, maxsize=2)
+    repo.get(1)
+    repo.get(2)
+    repo.get(1)
+    repo.get(3)
+    assert len(repo) == 2
+    assert repo.stats.evictions == 1
+    inner.gets = 0
+    repo.get(1)
+    assert inner.gets == 0
+    repo.get(2)
+    assert inner.gets == 1
+    with pytest.raises(ValueError):
+        CachedRepository(inner, maxsize=0)
+
+
+def test_ttl(inner):
+    """
+    Objects should be taken from the repository again when they expire.
+    """
+    now = [0.0]
+    repo = CachedRepository(inner, ttl=10, clock=lambda: now[0])
+    repo.get(1)
+    now[0] = 5
+    repo.get(1)
+    assert inner.gets == 1
+    now[0] = 10
+    repo.get(1)
+    assert inner.gets == 2
+    assert repo.stats.evictions == 1
+
+
+def test_invalidation(inner):
+    """
+    Updates and deletions through the wrapper should drop cached objects.
+    """
+    repo = CachedRepository(inner)
+    repo.get(1)
+    repo.get(2)
+    repo.update(Category("new", None, 1))
+    assert repo.get(1).name == "new"
+    repo.update_many([Category("newer", None, 1), Category("x", 1, 2)])
+    assert [repo.get(1).name, repo.get(2).name] == ["newer", "x"]
+    repo.delete(2)
+    assert repo.get(2) is None
+    repo.get(3)
+    repo.delete_many([3])
+    assert repo.get(3) is None
+    repo.get(1)
+    repo.cache_clear()
+    assert len(repo) == 0
+    assert repo.add(Category("y")) == 6
+    assert repo.get_all_where({"name": "y"})[0].pk == 6
+
+
+def test_transaction(tmp_path):
+    """
+    Objects read inside a transaction shouldn't be cached, so a rollback
+    doesn't leave uncommitted values in the cache.
+    """
+    with SQLiteRepository(str(tmp_path / "cached.db"), Category) as inner:
+        inner.add(Category("old"))
+        repo = CachedRepository(inner)
+        with pytest.raises(ZeroDivisionError):
+            with repo.transaction():
+                repo.update(Category("new", pk=1))
+                assert repo.get(1).name == "new"
+                assert len(repo) == 0
+                _ = 1 / 0
+        assert repo.get(1).name == "old"
+        assert len(repo) == 1
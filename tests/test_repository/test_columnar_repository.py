@@ -0,0 +1,164 @@
+"""
+Columnar repository class tests.
+"""
+
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.money import Money
+from bookkeeper.repository.columnar_repository import ColumnarRepository
+from bookkeeper.repository.events import Added, Deleted, Updated
+from bookkeeper.repository.query import Between, Ge, In, Like, Lt, Period, Query
+
+
+@pytest.fixture(name="repo")
+def fixture_repository():
+    """
+    A repository with a few expenses in March 2023.
+    """
+    repo = ColumnarRepository()
+    repo.add_many(
+        [
+            Expense(100, 1, datetime(2023, 3, 1, 12), "milk"),
+            Expense(10, 2, datetime(2023, 3, 13, 12), "book"),
+            Expense(1, 1, datetime(2023, 3, 14, 12), "milk"),
+            Expense(1000, 3, datetime(2023, 4, 2, 12)),
+        ]
+    )
+    return repo
+
+
+def test_crud(repo):
+    """
+    All CRUD operations should be performed correctly.
+    """
+    obj = Expense(5, 4, datetime(2023, 5, 1), "new")
+    pk = repo.add(obj)
+    assert pk == obj.pk == 5
+    assert repo.get(pk) == obj
+    assert isinstance(repo.get(pk).amount, Money)
+    obj2 = Expense(6, 4, datetime(2023, 5, 2), "newer", pk=pk)
+    repo.update(obj2)
+    assert repo.get(pk) == obj2
+    repo.delete(pk)
+    assert repo.get(pk) is None
+    assert len(repo) == 4
+    with pytest.raises(KeyError):
+        repo.delete(pk)
+    with pytest.raises(ValueError):
+        repo.update(obj2)
+    with pytest.raises(ValueError):
+        repo.add(obj2)
+
+
+def test_add_many_is_atomic(repo):
+    """
+    A failed add_many should leave no rows and no pks behind.
+    """
+    objs = [Expense(1, 1), Expense(2, "not an id")]
+    with pytest.raises(TypeError):
+        repo.add_many(objs)
+    assert [obj.pk for obj in objs] == [0, 0]
+    assert len(repo) == 4
+    assert repo.add(Expense(3, 1)) == 5
+
+
+def test_get_all_where(repo):
+    """
+    Conditions should be applied to the columns.
+    """
+    def amounts(where):
+        return [exp.amount for exp in repo.get_all_where(where)]
+
+    assert amounts(None) == [100, 10, 1, 1000]
+    assert amounts({"category": 1}) == [100, 1]
+    assert amounts({"category": 1, "comment": "milk"}) == [100, 1]
+    assert amounts({"comment": Like("BO%")}) == [10]
+    assert amounts({"comment": "none"}) == []
+    assert amounts({"amount": Between(5, 100)}) == [100, 10]
+    assert amounts({"amount": Ge(100), "category": In([3, 4])}) == [1000]
+    assert amounts({"expense_date": Lt(date(2023, 3, 13))}) == [100]
+    assert amounts({"expense_date": Between(date(2023, 3, 13), date(2023, 4, 1))}) == [
+        10,
+        1,
+    ]
+    assert amounts({"pk": In([2, 4])}) == [10, 1000]
+    repo.delete(2)
+    assert amounts({"amount": Lt(100)}) == [1]
+    assert list(repo.iter_where({"category": 1})) == repo.get_all_where({"category": 1})
+    with pytest.raises(ValueError):
+        repo.get_all_where({"price": 1})
+
+
+def test_find(repo):
+    """
+    Queries should be ordered, paged and projected.
+    """
+    assert repo.find(Query(order_by=("-amount",), limit=2, columns=("amount",))) == [
+        (1000,),
+        (100,),
+    ]
+    assert repo.find(
+        Query(order_by=("comment", "-amount"), offset=1, columns=("comment", "pk"))
+    ) == [("book", 2), ("milk", 1), ("milk", 3)]
+    assert [exp.pk for exp in repo.find(Query({"category": 1}, order_by=("-pk",)))] == [
+        3,
+        1,
+    ]
+
+
+def test_sum_by(repo):
+    """
+    Sums should be grouped by fields and periods.
+    """
+    assert repo.sum_by("amount") == {None: 1111}
+    assert isinstance(repo.sum_by("amount")[None], Money)
+    assert repo.sum_by("amount", where={"category": 4}) == {}
+    assert repo.sum_by("amount", group_by="category") == {1: 101, 2: 10, 3: 1000}
+    assert repo.sum_by("amount", group_by="comment", where={"amount": Lt(1000)}) == {
+        "milk": 101,
+        "book": 10,
+    }
+    assert repo.sum_by("amount", group_by=Period("expense_date", "week")) == {
+        date(2023, 2, 27): 100,
+        date(2023, 3, 13): 11,
+        date(2023, 3, 27): 1000,
+    }
+    assert repo.sum_by("amount", group_by=Period("expense_date", "month")) == {
+        date(2023, 3, 1): 111,
+        date(2023, 4, 1): 1000,
+    }
+    repo.delete(4)
+    assert repo.sum_by("amount") == {None: 111}
+    with pytest.raises(ValueError):
+        repo.sum_by("comment")
+
+
+def test_compact(repo):
+    """
+    Deleted rows and unused comments should be dropped once they are half
+    of the rows, pks should stay.
+    """
+    repo.delete_many([1, 2, 3])
+    assert len(repo._pks) == 1
+    assert repo._strings == [""]
+    assert repo.get(4).amount == 1000
+    assert repo.add(Expense(1, 1)) == 5
+    assert [exp.pk for exp in repo.get_all_where()] == [4, 5]
+
+
+def test_events(repo):
+    """
+    Listeners should get the changes with the old entries.
+    """
+    events = []
+    repo.subscribe(events.extend)
+    obj = Expense(5, 4)
+    repo.add(obj)
+    old = repo.get(1)
+    new = Expense(7, 1, old.expense_date, pk=1)
+    repo.update(new)
+    repo.delete_many([1, 1])
+    assert events == [Added(obj), Updated(old, new), Deleted(new)]
@@ -2,7 +2,22 @@
 Memory repository class tests.
 """
 
+from datetime import date, datetime
+from inspect import isgenerator
+
+from bookkeeper.repository.events import Added, Deleted, Updated
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import (
+    Between,
+    Ge,
+    Gt,
+    In,
+    Le,
+    Like,
+    Lt,
+    Period,
+    Query,
+)
 
 import pytest
 
@@ -105,3 +120,262 @@ def test_get_all_with_condition(repo, custom_class):
         objects.append(o)
     assert repo.get_all_where({"name": "0"}) == [objects[0]]
     assert repo.get_all_where({"test": "test"}) == objects
+
+
+def test_add_many(repo, custom_class):
+    """
+    Several objects should be added at once and get their pks in order.
+    """
+    objects = [custom_class() for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects]
+    assert pks == sorted(set(pks))
+    assert repo.get_all_where() == objects
+
+
+def test_add_many_is_atomic(repo, custom_class):
+    """
+    Either all objects should be added or none.
+    """
+    objects = [custom_class() for i in range(5)]
+    objects[3].pk = 1
+    with pytest.raises(ValueError):
+        repo.add_many(objects)
+    assert repo.get_all_where() == []
+    assert all(o.pk == 0 for o in objects[:3])
+
+
+def test_update_many(repo, custom_class):
+    """
+    Several entries should be updated at once.
+    """
+    repo.add_many([custom_class() for i in range(3)])
+    objects = []
+    for pk in (1, 3):
+        o = custom_class()
+        o.pk = pk
+        objects.append(o)
+    repo.update_many(objects)
+    assert repo.get(1) is objects[0]
+    assert repo.get(3) is objects[1]
+    with pytest.raises(ValueError):
+        repo.update_many([custom_class()])
+
+
+def test_delete_many(repo, custom_class):
+    """
+    Several entries should be deleted at once, either all of them or none.
+    """
+    objects = [custom_class() for i in range(5)]
+    repo.add_many(objects)
+    repo.delete_many([1, 3])
+    assert repo.get_all_where() == [objects[1], objects[3], objects[4]]
+    with pytest.raises(KeyError):
+        repo.delete_many([2, 3])
+    assert repo.get(2) is objects[1]
+
+
+def test_indexed_get_all_where(custom_class):
+    """
+    Indexed lookups should give the same results as a full scan and follow
+    additions, updates and deletions.
+    """
+    repo = MemoryRepository(indexes=["name", "test"])
+    objects = []
+    for i in range(6):
+        o = custom_class()
+        o.name = str(i % 3)
+        o.test = "test"
+        objects.append(o)
+    repo.add_many(objects[:3])
+    for o in objects[3:]:
+        repo.add(o)
+    assert repo.get_all_where({"name": "0"}) == [objects[0], objects[3]]
+    assert repo.get_all_where({"name": "1", "test": "test"}) == [objects[1], objects[4]]
+    assert repo.get_all_where({"name": "3"}) == []
+
+    changed = custom_class()
+    changed.pk = objects[0].pk
+    changed.name = "3"
+    changed.test = "other"
+    repo.update(changed)
+    assert repo.get_all_where({"name": "0"}) == [objects[3]]
+    assert repo.get_all_where({"name": "3"}) == [changed]
+    assert repo.get_all_where({"test": "test"}) == objects[1:]
+
+    repo.delete(objects[3].pk)
+    repo.delete_many([objects[4].pk])
+    assert repo.get_all_where({"name": "0"}) == []
+    assert repo.get_all_where({"test": "test"}) == [objects[1], objects[2], objects[5]]
+    assert repo._indexes["name"].keys() == {"1", "2", "3"}
+
+
+def test_sorted_index_follows_changes(custom_class):
+    """
+    Range lookups should see values added and removed after the index values
+    were sorted, values that can't be sorted should be sorted again once
+    they are gone.
+    """
+    repo = MemoryRepository(indexes=["value"])
+
+    def add(value):
+        o = custom_class()
+        o.value = value
+        repo.add(o)
+        return o
+
+    objects = [add(v) for v in (5, 1, 3)]
+    assert repo.get_all_where({"value": Ge(2)}) == [objects[0], objects[2]]
+    objects.append(add(4))
+    objects.append(add(None))
+    assert repo._sorted["value"] == [1, 3, 4, 5]
+    assert repo.get_all_where({"value": Between(2, 4)}) == [objects[2], objects[3]]
+    repo.delete(objects[2].pk)
+    assert repo._sorted["value"] == [1, 4, 5]
+    text = add("text")
+    assert repo._sorted["value"] is None
+    repo.delete(text.pk)
+    assert repo.get_all_where({"value": Gt(1)}) == [objects[0], objects[3]]
+    assert repo._sorted["value"] == [1, 4, 5]
+
+
+def test_get_all_with_like(custom_class):
+    """
+    Conditions should work both with and without indexes.
+    """
+    for repo in (MemoryRepository(), MemoryRepository(indexes=["name"])):
+        objects = []
+        for name in ("Foo", "bar", "foo%"):
+            o = custom_class()
+            o.name = name
+            objects.append(o)
+        repo.add_many(objects)
+        assert repo.get_all_where({"name": Like("foo%")}) == [objects[0], objects[2]]
+        assert repo.get_all_where({"name": Like("_a_")}) == [objects[1]]
+
+
+@pytest.mark.parametrize("indexes", [(), ("value",)])
+def test_find(custom_class, indexes):
+    """
+    Queries should filter by ranges, order, page and project the entries,
+    with or without indexes.
+    """
+    repo = MemoryRepository(indexes=indexes)
+    objects = []
+    for i in range(10):
+        o = custom_class()
+        o.value = i % 5
+        o.name = str(i)
+        objects.append(o)
+    repo.add_many(objects)
+    assert repo.find(Query({"value": Between(1, 2)})) == [
+        objects[1], objects[2], objects[6], objects[7]
+    ]
+    assert repo.find(Query({"value": Lt(1)})) == [objects[0], objects[5]]
+    assert repo.find(Query({"value": Le(1), "name": Like("_")})) == [
+        objects[0], objects[1], objects[5], objects[6]
+    ]
+    assert repo.find(Query({"value": Gt(3)})) == [objects[4], objects[9]]
+    assert repo.find(Query({"value": Ge(4)})) == [objects[4], objects[9]]
+    assert repo.find(Query({"value": In([4, 0, 7])})) == [
+        objects[0], objects[4], objects[5], objects[9]
+    ]
+    assert repo.find(Query({"value": In([])})) == []
+    assert repo.find(
+        Query({"value": Ge(3)}, order_by=("-value", "name"), columns=("pk", "value"))
+    ) == [(5, 4), (10, 4), (4, 3), (9, 3)]
+    assert repo.find(Query(order_by=("value", "-name"), limit=3, offset=1)) == [
+        objects[0], objects[6], objects[1]
+    ]
+
+    changed = custom_class()
+    changed.pk = objects[0].pk
+    changed.value = 100
+    changed.name = "0"
+    repo.update(changed)
+    repo.delete(objects[9].pk)
+    assert repo.find(Query({"value": Ge(4)})) == [changed, objects[4]]
+
+
+def test_iter_where(repo, custom_class):
+    """
+    Iteration should give the same entries as get_all_where.
+    """
+    objects = [custom_class() for i in range(5)]
+    for i, o in enumerate(objects):
+        o.name = str(i % 2)
+    repo.add_many(objects)
+    gen = repo.iter_where({"name": "0"})
+    assert isgenerator(gen)
+    assert list(gen) == repo.get_all_where({"name": "0"})
+    assert list(repo.iter_where()) == objects
+
+
+def test_sum_by(repo, custom_class):
+    """
+    Sums should be grouped by fields and periods in one pass.
+    """
+    objects = []
+    for amount, kind, day in [
+        (1, "a", date(2023, 3, 12)),
+        (2, "b", datetime(2023, 3, 13, 10)),
+        (4, "a", "2023-03-19"),
+        (8, "b", date(2023, 4, 1)),
+    ]:
+        o = custom_class()
+        o.amount, o.kind, o.day = amount, kind, day
+        objects.append(o)
+    repo.add_many(objects)
+    assert repo.sum_by("amount") == {None: 15}
+    assert repo.sum_by("amount", where={"kind": "c"}) == {}
+    assert repo.sum_by("amount", group_by="kind") == {"a": 5, "b": 10}
+    assert repo.sum_by(
+        "amount", group_by=Period("day", "week"), where={"kind": "a"}
+    ) == {date(2023, 3, 6): 1, date(2023, 3, 13): 4}
+    assert repo.sum_by("amount", group_by=Period("day", "month")) == {
+        date(2023, 3, 1): 7,
+        date(2023, 4, 1): 8,
+    }
+    with pytest.raises(ValueError):
+        Period("day", "year")
+
+
+def test_events(repo, custom_class):
+    """
+    Listeners should get a list of events for every change, with the entries
+    as they were before updates and deletions.
+    """
+    batches = []
+    repo.subscribe(batches.append)
+    objects = [custom_class() for i in range(3)]
+    for i, obj in enumerate(objects):
+        obj.name = str(i)
+    repo.add(objects[0])
+    repo.add_many(objects[1:])
+    new = custom_class()
+    new.pk, new.name = 1, "new"
+    repo.update(new)
+    objects[1].name = "changed"
+    repo.update_many([objects[1]])
+    repo.delete(1)
+    repo.delete_many([2, 3])
+
+    def described(event):
+        if isinstance(event, Added):
+            return "added", event.obj.pk, event.obj.name
+        if isinstance(event, Updated):
+            return "updated", event.old.pk, event.old.name, event.new
+        assert isinstance(event, Deleted)
+        return "deleted", event.obj.pk, event.obj.name
+
+    assert [[described(event) for event in batch] for batch in batches] == [
+        [("added", 1, "0")],
+        [("added", 2, "changed"), ("added", 3, "2")],
+        [("updated", 1, "0", new)],
+        [("updated", 2, "1", objects[1])],
+        [("deleted", 1, "new")],
+        [("deleted", 2, "changed"), ("deleted", 3, "2")],
+    ]
+    repo.unsubscribe(batches.append)
+    repo.add(custom_class())
+    assert len(batches) == 6
@@ -0,0 +1,76 @@
+"""
+Query conditions tests.
+"""
+
+from bookkeeper.repository.query import (
+    Between,
+    Ge,
+    Gt,
+    In,
+    Le,
+    Like,
+    Lt,
+    Query,
+    apply,
+    matches,
+    to_sql,
+)
+
+
+def test_like():
+    """
+    LIKE patterns should behave as in SQL.
+    """
+    assert Like("a%").matches("ABC")
+    assert Like("a_c").matches("abc")
+    assert not Like("a_c").matches("abbc")
+    assert Like("1.%").matches(1.5)
+    assert not Like("%").matches(None)
+    assert Like("a.c").sql("col") == ("col LIKE ?", ["a.c"])
+    assert not Like("a.c").matches("abc")
+
+
+def test_plain_values():
+    """
+    Plain values should mean equality.
+    """
+    assert matches(1, 1)
+    assert not matches(1, "1")
+    assert matches(None, None)
+    assert to_sql("col", 1) == ("col = ?", [1])
+    assert to_sql("col", None) == ("col IS NULL", [])
+
+
+def test_comparisons():
+    """
+    Comparisons should behave as in SQL.
+    """
+    assert Lt(2).matches(1) and not Lt(2).matches(2) and not Lt(2).matches(None)
+    assert Le(2).matches(2) and not Le(2).matches(3)
+    assert Gt(2).matches(3) and not Gt(2).matches(2)
+    assert Ge(2).matches(2) and not Ge(2).matches(None)
+    assert Between(1, 3).matches(3) and not Between(1, 3).matches(4)
+    assert In([1, 2]).matches(2) and not In([1, 2]).matches(None)
+    assert In(x for x in (1, 2)) == In((1, 2))
+    assert Between(1, 3).sql("col") == ("col BETWEEN ? AND ?", [1, 3])
+    assert In([1, 2]).sql("col") == ("col IN (?, ?)", [1, 2])
+
+
+def test_apply():
+    """
+    Ordering, paging and projection should be applied in this order.
+    """
+
+    class Obj:
+        def __init__(self, a, b):
+            self.a = a
+            self.b = b
+
+    objects = [Obj(1, "x"), Obj(None, "y"), Obj(2, "x"), Obj(1, "z")]
+    assert apply(objects, Query()) == objects
+    assert apply(objects, Query(order_by=("a",), columns=("a",))) == [
+        (None,), (1,), (1,), (2,)
+    ]
+    assert apply(objects, Query(order_by=("b", "-a"), limit=2, offset=1)) == [
+        objects[0], objects[1]
+    ]
@@ -2,10 +2,27 @@
 SQLite repository class tests.
 """
 from dataclasses import dataclass
+from datetime import date, datetime
 import os
+import sqlite3
+import threading
+from inspect import isgenerator
+from typing import ClassVar
+
 import pytest
 
-from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.money import Money
+from bookkeeper.repository.events import Added, Deleted, Updated
+from bookkeeper.repository.query import Between, Ge, Gt, In, Like, Lt, Period, Query
+from bookkeeper.repository.sqlite_repository import (
+    ConnectionPool,
+    SQLiteCategoryRepository,
+    SQLiteConfig,
+    SQLiteRepository,
+    row_factory,
+)
 
 
 @pytest.fixture(name="custom_class")
@@ -32,7 +49,8 @@ def fixture_repository(custom_class):
     os.remove(db_path)
     temp = open(db_path, "a", encoding="utf-8")
     temp.close()
-    return SQLiteRepository(db_name=db_path, entry_cls=custom_class)
+    with SQLiteRepository(db_name=db_path, entry_cls=custom_class) as repo:
+        yield repo
 
 
 def test_crud(repo: SQLiteRepository, custom_class):
@@ -114,3 +132,716 @@ def test_get_all_with_condition(repo: SQLiteRepository, custom_class):
     assert [objects[0]] == repo.get_all_where({"col1": 0, "col2": "test"})
     assert objects == repo.get_all_where({"col2": "test"})
     assert repo.get_all_where({"col2": "random"}) is None
+
+
+def test_connection_is_reused(repo: SQLiteRepository, custom_class):
+    """
+    The repository should keep one connection per thread between calls.
+    """
+    repo.add(custom_class())
+    con = repo._pool.connection()
+    repo.add(custom_class())
+    repo.get_all_where()
+    assert repo._pool.connection() is con
+    assert con.execute("PRAGMA foreign_keys").fetchone() == (1,)
+
+
+def test_close(repo: SQLiteRepository, custom_class):
+    """
+    A closed repository should reopen its connection on demand.
+    """
+    obj = custom_class()
+    repo.add(obj)
+    con = repo._pool.connection()
+    repo.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        con.execute("SELECT 1")
+    assert repo.get(obj.pk) == obj
+
+
+def test_connection_per_thread(repo: SQLiteRepository, custom_class):
+    """
+    Each thread should get a connection of its own.
+    """
+    obj = custom_class()
+    repo.add(obj)
+    result = {}
+
+    def worker():
+        result["con"] = repo._pool.connection()
+        result["obj"] = repo.get(obj.pk)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert result["con"] is not repo._pool.connection()
+    assert result["obj"] == obj
+
+
+def test_add_many(repo: SQLiteRepository, custom_class):
+    """
+    Several objects should be added at once and get their pks in order.
+    """
+    repo.add(custom_class())
+    objects = [custom_class(col2=str(i)) for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects] == [2, 3, 4, 5, 6]
+    assert repo.get_all_where()[1:] == objects
+    assert repo.add(custom_class()) == 7
+
+
+def test_add_many_is_atomic(repo: SQLiteRepository, custom_class):
+    """
+    Either all objects should be added or none.
+    """
+    objects = [custom_class() for i in range(5)]
+    objects[3].pk = 1
+    with pytest.raises(ValueError):
+        repo.add_many(objects)
+    assert repo.get_all_where() is None
+    assert all(o.pk == 0 for o in objects[:3])
+
+
+def test_update_many(repo: SQLiteRepository, custom_class):
+    """
+    Several entries should be updated at once, either all of them or none.
+    """
+    repo.add_many([custom_class() for i in range(3)])
+    objects = [custom_class(col2="bar", pk=pk) for pk in (1, 3)]
+    repo.update_many(objects)
+    assert [repo.get(1), repo.get(3)] == objects
+    with pytest.raises(ValueError):
+        repo.update_many([custom_class(col2="baz", pk=2), custom_class(pk=100)])
+    assert repo.get(2).col2 == "foo"
+    with pytest.raises(ValueError):
+        repo.update_many([custom_class()])
+
+
+def test_delete_many(repo: SQLiteRepository, custom_class):
+    """
+    Several entries should be deleted at once, either all of them or none.
+    """
+    objects = [custom_class(col1=i) for i in range(5)]
+    repo.add_many(objects)
+    repo.delete_many([1, 3])
+    assert repo.get_all_where() == [objects[1], objects[3], objects[4]]
+    with pytest.raises(KeyError):
+        repo.delete_many([2, 3, 4])
+    assert repo.get_all_where() == [objects[1], objects[3], objects[4]]
+
+
+def test_transaction_commits_once(repo: SQLiteRepository, custom_class):
+    """
+    Writes inside a transaction should be committed together at its end.
+    """
+    with repo.transaction() as con:
+        repo.add(custom_class())
+        repo.add(custom_class())
+        assert con.in_transaction
+    assert not con.in_transaction
+    other = sqlite3.connect(repo.db_name)
+    assert other.execute(f"SELECT COUNT(*) FROM {repo.table_name}").fetchone() == (2,)
+    other.close()
+
+
+def test_transaction_rollback(repo: SQLiteRepository, custom_class):
+    """
+    An exception should roll the whole transaction back.
+    """
+    with pytest.raises(ZeroDivisionError):
+        with repo.transaction():
+            repo.add(custom_class())
+            repo.add_many([custom_class(), custom_class()])
+            _ = 1 / 0
+    assert repo.get_all_where() is None
+
+
+def test_nested_transaction_rollback(repo: SQLiteRepository, custom_class):
+    """
+    An exception in a nested transaction should roll back only the nested part.
+    """
+    with repo.transaction():
+        repo.add(custom_class(col2="outer"))
+        with pytest.raises(ValueError):
+            with repo.transaction():
+                repo.add(custom_class(col2="inner"))
+                repo.update(custom_class(pk=100))
+    assert [o.col2 for o in repo.get_all_where()] == ["outer"]
+
+
+def test_failed_commit(repo: SQLiteRepository, custom_class):
+    """
+    A commit that fails should roll the transaction back, drop its events and
+    leave the connection ready for the next transaction.
+    """
+    batches = []
+    repo.subscribe(batches.append)
+    with repo.transaction() as con:
+        con.execute(
+            f"""CREATE TABLE IF NOT EXISTS dangling(
+            ref INTEGER REFERENCES {repo.table_name}(id) DEFERRABLE INITIALLY DEFERRED)"""
+        )
+    with pytest.raises(sqlite3.IntegrityError):
+        with repo.transaction() as con:
+            repo.add(custom_class())
+            con.execute("""INSERT INTO dangling VALUES (100)""")
+    assert not con.in_transaction
+    assert repo.get_all_where() is None
+    with repo.transaction():
+        repo.add(custom_class(col2="next"))
+    assert [o.col2 for o in repo.get_all_where()] == ["next"]
+    assert len(batches) == 1
+
+
+def test_shared_pool(repo: SQLiteRepository, custom_class):
+    """
+    Repositories sharing a pool should take part in the same transaction.
+    """
+
+    @dataclass
+    class Other:
+        name: str = "other"
+        pk: int = 0
+
+    other_repo = SQLiteRepository(repo.db_name, Other, repo._pool)
+    with pytest.raises(ZeroDivisionError):
+        with other_repo.transaction():
+            repo.add(custom_class())
+            other_repo.add(Other())
+            _ = 1 / 0
+    assert repo.get_all_where() is None
+    assert other_repo.get_all_where() is None
+    with pytest.raises(ValueError):
+        SQLiteRepository("another.db", Other, repo._pool)
+
+
+def test_get_all_with_typed_condition(repo: SQLiteRepository, custom_class):
+    """
+    Plain values should be compared for equality with their own type.
+    """
+    objects = [custom_class(i, str(i)) for i in range(12)]
+    repo.add_many(objects)
+    assert repo.get_all_where({"col1": 1}) == [objects[1]]
+    assert repo.get_all_where({"col1": 100}) is None
+    assert repo.get_all_where({"col2": "1"}) == [objects[1]]
+    assert repo.get_all_where({"pk": objects[3].pk}) == [objects[3]]
+    assert repo.get_all_where({"col2": None}) is None
+    with pytest.raises(ValueError):
+        repo.get_all_where({"no_such_field": 1})
+
+
+def test_get_all_with_like(repo: SQLiteRepository, custom_class):
+    """
+    LIKE should be used only when asked for.
+    """
+    objects = [custom_class(1, "Foo"), custom_class(2, "bar"), custom_class(3, "foo%")]
+    repo.add_many(objects)
+    assert repo.get_all_where({"col2": "foo%"}) == [objects[2]]
+    assert repo.get_all_where({"col2": Like("foo%")}) == [objects[0], objects[2]]
+
+
+def test_indexed_fields(tmp_path):
+    """
+    Fields declared in the entry class should be indexed.
+    """
+
+    @dataclass
+    class Indexed:
+        indexed_fields: ClassVar[tuple[str, ...]] = ("col1",)
+        col1: int = 1
+        col2: str = "foo"
+        pk: int = 0
+
+    with SQLiteRepository(str(tmp_path / "indexed.db"), Indexed) as repo:
+        assert "indexed_fields" not in repo.fields
+        repo.add(Indexed())
+        con = repo._pool.connection()
+        plan = con.execute("EXPLAIN QUERY PLAN SELECT * FROM indexed WHERE col1 = 1")
+        assert "USING INDEX indexed_col1_idx" in plan.fetchone()[-1]
+
+
+def test_find(repo: SQLiteRepository, custom_class):
+    """
+    Queries should filter by ranges, order, page and project the entries.
+    """
+    objects = [custom_class(i % 5, str(i)) for i in range(10)]
+    repo.add_many(objects)
+    assert repo.find(Query({"col1": Between(1, 2)})) == [
+        objects[1], objects[2], objects[6], objects[7]
+    ]
+    assert repo.find(Query({"col1": Lt(1)})) == [objects[0], objects[5]]
+    assert repo.find(Query({"col1": Gt(3)})) == [objects[4], objects[9]]
+    assert repo.find(Query({"col1": Ge(4), "col2": Like("9")})) == [objects[9]]
+    assert repo.find(Query({"col1": In([4, 0, 7])})) == [
+        objects[0], objects[4], objects[5], objects[9]
+    ]
+    assert repo.find(Query({"col1": In([])})) == []
+    assert repo.find(
+        Query({"col1": Ge(3)}, order_by=("-col1", "col2"), columns=("pk", "col1"))
+    ) == [(5, 4), (10, 4), (4, 3), (9, 3)]
+    assert repo.find(Query(order_by=("col1", "-col2"), limit=3, offset=1)) == [
+        objects[0], objects[6], objects[1]
+    ]
+    assert repo.find(Query(order_by=("pk",), offset=8)) == objects[8:]
+    with pytest.raises(ValueError):
+        repo.find(Query(order_by=("-no_such_field",)))
+
+
+def test_iter_where(repo: SQLiteRepository, custom_class):
+    """
+    Iteration should give the same entries as get_all_where, batch by batch.
+    """
+    objects = [custom_class(i % 2, str(i)) for i in range(7)]
+    repo.add_many(objects)
+    gen = repo.iter_where({"col1": 0}, batch_size=2)
+    assert isgenerator(gen)
+    assert next(gen) == objects[0]
+    assert list(gen) == objects[2::2]
+    assert list(repo.iter_where(batch_size=3)) == objects
+    assert list(repo.iter_where({"col1": 5})) == []
+
+
+def test_sum_by(repo: SQLiteRepository):
+    """
+    Sums should be grouped by fields and periods by SQLite.
+    """
+
+    @dataclass
+    class Spending:
+        amount: int
+        kind: str
+        day: str
+        pk: int = 0
+
+    with SQLiteRepository(repo.db_name, Spending, repo._pool) as spendings:
+        spendings.add_many(
+            [
+                Spending(1, "a", "2023-03-12"),
+                Spending(2, "b", "2023-03-13 10:00:00"),
+                Spending(4, "a", "2023-03-19"),
+                Spending(8, "b", "2023-04-01"),
+            ]
+        )
+        assert spendings.sum_by("amount") == {None: 15}
+        assert spendings.sum_by("amount", where={"kind": "c"}) == {}
+        assert spendings.sum_by("amount", group_by="kind") == {"a": 5, "b": 10}
+        assert spendings.sum_by(
+            "amount", group_by=Period("day", "week"), where={"kind": "a"}
+        ) == {date(2023, 3, 6): 1, date(2023, 3, 13): 4}
+        assert spendings.sum_by("amount", group_by=Period("day", "month")) == {
+            date(2023, 3, 1): 7,
+            date(2023, 4, 1): 8,
+        }
+        assert spendings.sum_by("amount", group_by=Period("day")) == {
+            date(2023, 3, 12): 1,
+            date(2023, 3, 13): 2,
+            date(2023, 3, 19): 4,
+            date(2023, 4, 1): 8,
+        }
+
+
+def test_events(repo: SQLiteRepository, custom_class):
+    """
+    Listeners should get a list of events for every change, with the entries
+    as they were before updates and deletions.
+    """
+    batches = []
+    repo.subscribe(batches.append)
+    objects = [custom_class(col1=i) for i in range(3)]
+    repo.add(objects[0])
+    repo.add_many(objects[1:])
+    new = custom_class(col1=10, pk=1)
+    repo.update(new)
+    new2 = custom_class(col1=20, pk=2)
+    repo.update_many([new2])
+    repo.delete(1)
+    repo.delete(100)
+    with pytest.raises(KeyError):
+        repo.delete_many([2, 3, 100])
+    repo.delete_many([2, 3])
+    assert batches == [
+        [Added(objects[0])],
+        [Added(objects[1]), Added(objects[2])],
+        [Updated(objects[0], new)],
+        [Updated(objects[1], new2)],
+        [Deleted(new)],
+        [Deleted(new2), Deleted(objects[2])],
+    ]
+    repo.unsubscribe(batches.append)
+    repo.add(custom_class())
+    assert len(batches) == 6
+
+
+def test_events_per_transaction(repo: SQLiteRepository, custom_class):
+    """
+    Listeners should be notified once per committed transaction and never
+    about changes that were rolled back.
+    """
+
+    @dataclass
+    class Other:
+        name: str = "other"
+        pk: int = 0
+
+    other_repo = SQLiteRepository(repo.db_name, Other, repo._pool)
+    batches = []
+    other_batches = []
+    repo.subscribe(batches.append)
+    other_repo.subscribe(other_batches.append)
+    obj1, obj2, obj3 = custom_class(), custom_class(), custom_class()
+    other = Other()
+    with repo.transaction():
+        repo.add(obj1)
+        other_repo.add(other)
+        with pytest.raises(ValueError):
+            with repo.transaction():
+                repo.add(obj3)
+                repo.update(custom_class(pk=100))
+        repo.add_many([obj2])
+        assert batches == other_batches == []
+    assert batches == [[Added(obj1), Added(obj2)]]
+    assert other_batches == [[Added(other)]]
+
+    with pytest.raises(ZeroDivisionError):
+        with repo.transaction():
+            repo.delete(obj1.pk)
+            _ = 1 / 0
+    assert len(batches) == 1
+    repo.delete(obj1.pk)
+    assert batches[1] == [Deleted(obj1)]
+
+
+def test_interrupt(repo: SQLiteRepository, custom_class):
+    """
+    Interrupting should abort a query running in another thread.
+    """
+    repo.add_many(custom_class() for i in range(100))
+    started = threading.Event()
+    result = {}
+
+    def worker():
+        con = repo._pool.connection()
+        started.set()
+        try:
+            # a cross join that would take very long to finish
+            con.execute(
+                f"SELECT COUNT(*) FROM {repo.table_name} a, {repo.table_name} b, "
+                f"{repo.table_name} c, {repo.table_name} d, {repo.table_name} e"
+            ).fetchone()
+        except sqlite3.OperationalError as exc:
+            result["error"] = exc
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    started.wait()
+    while thread.is_alive():
+        repo.interrupt()
+        thread.join(0.01)
+    assert "interrupted" in str(result["error"])
+
+
+@dataclass
+class Typed:
+    """
+    An entry class with fields of all the supported types.
+    """
+
+    amount: int
+    price: float
+    moment: datetime
+    day: date
+    parent: int | None = None
+    name: str = ""
+    pk: int = 0
+
+
+def test_typed_columns(repo: SQLiteRepository):
+    """
+    Column types should follow the annotations, dates should be stored as
+    integers and read back as dates.
+    """
+    with SQLiteRepository(repo.db_name, Typed, repo._pool) as typed:
+        con = typed._pool.connection()
+        types = {
+            name: type_ for _, name, type_, *_ in con.execute("PRAGMA table_info(typed)")
+        }
+        assert types == {
+            "id": "INTEGER",
+            "amount": "INTEGER",
+            "price": "REAL",
+            "moment": "DATETIME_US INTEGER",
+            "day": "DATE_US INTEGER",
+            "parent": "INTEGER",
+            "name": "TEXT",
+        }
+        obj = Typed(1, 1.5, datetime(2023, 3, 12, 10, 30, 0, 5), date(1969, 7, 20))
+        typed.add(obj)
+        assert typed.get(obj.pk) == obj
+        assert con.execute("SELECT typeof(moment), day + 0 FROM typed").fetchone() == (
+            "integer",
+            -165 * 24 * 3600 * 10**6,
+        )
+        assert typed.get_all_where({"moment": Gt(date(2023, 3, 12))}) == [obj]
+        assert typed.sum_by("amount", group_by=Period("moment", "month")) == {
+            date(2023, 3, 1): 1
+        }
+        assert typed.sum_by("price", group_by=Period("day", "week")) == {
+            date(1969, 7, 14): 1.5
+        }
+
+
+def test_migrate_untyped_table(repo: SQLiteRepository):
+    """
+    A table of an earlier version should be rebuilt with typed columns.
+    """
+    con = repo._pool.connection()
+    with repo.transaction():
+        con.execute(
+            """CREATE TABLE typed('id' INTEGER UNIQUE, amount, moment, day, old,
+            PRIMARY KEY("id" AUTOINCREMENT))"""
+        )
+        con.executemany(
+            "INSERT INTO typed(amount, moment, day, old) VALUES (?, ?, ?, ?)",
+            [
+                ("213.0", "2012-02-23", "2012-02-24", "x"),
+                ("1.5", "2023-03-12 10:30:00.000005", "2023-03-12", "y"),
+                (1, "2023-03-13", "2023-03-13", "z"),
+            ],
+        )
+        con.execute("DELETE FROM typed WHERE id = 3")
+    # the column Typed doesn't have isn't dropped unless asked to
+    with pytest.raises(ValueError, match="old"):
+        SQLiteRepository(repo.db_name, Typed, repo._pool)
+    assert con.execute("SELECT old FROM typed").fetchall() == [("x",), ("y",)]
+    with SQLiteRepository(repo.db_name, Typed, repo._pool, drop_columns=["old"]) as typed:
+        assert typed.get_all_where() == [
+            Typed(213, None, datetime(2012, 2, 23), date(2012, 2, 24), name=None, pk=1),
+            Typed(
+                1.5,
+                None,
+                datetime(2023, 3, 12, 10, 30, 0, 5),
+                date(2023, 3, 12),
+                name=None,
+                pk=2,
+            ),
+        ]
+        assert typed.add(Typed(1, 1.0, datetime.now(), date.today())) == 4
+
+    con = repo._pool.connection()
+    with repo.transaction():
+        con.execute("DROP TABLE typed")
+        con.execute("CREATE TABLE typed('id' INTEGER UNIQUE, moment)")
+        con.execute("INSERT INTO typed(moment) VALUES ('garbage')")
+    with pytest.raises(ValueError):
+        SQLiteRepository(repo.db_name, Typed, repo._pool)
+
+
+def test_money_column(repo: SQLiteRepository):
+    """
+    Money should be stored as integer minor units and summed exactly.
+    """
+    with SQLiteRepository(repo.db_name, Expense, repo._pool) as expenses:
+        con = expenses._pool.connection()
+        expenses.add_many(
+            [Expense(Money.parse("0.10"), 1, datetime(2023, 3, 12)) for _ in range(3)]
+        )
+        row = con.execute("SELECT typeof(amount), amount + 0 FROM expense").fetchone()
+        assert row == ("integer", 10)
+        assert isinstance(expenses.get(1).amount, Money)
+        totals = expenses.sum_by("amount", group_by="category")
+        assert totals == {1: Money(30)}
+        assert isinstance(totals[1], Money)
+        assert str(totals[1]) == "0.30"
+        # e.g. a row of an earlier version with no sum
+        with expenses.transaction():
+            con.execute("INSERT INTO expense(amount, category) VALUES (NULL, 2)")
+        assert expenses.sum_by("amount", group_by="category") == {
+            1: Money(30),
+            2: Money(0),
+        }
+
+
+def test_migrate_money(repo: SQLiteRepository):
+    """
+    Sums in major units of an earlier version should become Money.
+    """
+    con = repo._pool.connection()
+    with repo.transaction():
+        con.execute(
+            """CREATE TABLE expense('id' INTEGER UNIQUE, amount, category,
+            expense_date, comment, PRIMARY KEY("id" AUTOINCREMENT))"""
+        )
+        con.executemany(
+            "INSERT INTO expense(amount, category, expense_date) VALUES (?, ?, ?)",
+            [("213.0", 1, "2012-02-23"), (0.1, 1, "2012-02-23"), (7, 2, "2012-02-24")],
+        )
+    with SQLiteRepository(repo.db_name, Expense, repo._pool) as expenses:
+        assert [exp.amount for exp in expenses.get_all_where()] == [21300, 10, 700]
+        assert expenses.sum_by("amount") == {None: Money(22010)}
+    # reopening a migrated table leaves the sums alone
+    with SQLiteRepository(repo.db_name, Expense, repo._pool) as expenses:
+        assert expenses.sum_by("amount") == {None: Money(22010)}
+
+
+def test_category_hierarchy(repo: SQLiteRepository):
+    """
+    Hierarchy queries should be answered by SQLite.
+    """
+    with SQLiteCategoryRepository(repo.db_name, repo._pool) as cats:
+        tree = Category.create_from_tree(
+            [("0", None), ("1", "0"), ("2", "0"), ("3", "1"), ("4", None)], cats
+        )
+        pks = {cat.name: cat.pk for cat in tree}
+        assert [c.name for c in cats.ancestors(pks["3"])] == ["1", "0"]
+        assert cats.ancestors(pks["0"]) == []
+        assert [c.name for c in cats.descendants(pks["0"])] == ["1", "2", "3"]
+        assert cats.descendants(pks["3"]) == []
+        with SQLiteRepository(repo.db_name, Expense, repo._pool) as expenses:
+            expenses.add_many(
+                [
+                    Expense(100, pks["0"], datetime(2023, 3, 1)),
+                    Expense(10, pks["3"], datetime(2023, 3, 2)),
+                    Expense(1, pks["2"], datetime(2023, 3, 3)),
+                    Expense(1000, pks["4"], datetime(2023, 3, 4)),
+                ]
+            )
+            assert cats.sum_under(pks["0"], expenses) == 111
+            assert isinstance(cats.sum_under(pks["0"], expenses), Money)
+            assert cats.sum_under(pks["1"], expenses) == 10
+            assert cats.sum_under(pks["4"], expenses, where={"amount": Lt(1000)}) == 0
+            assert (
+                cats.sum_under(
+                    pks["0"], expenses, where={"expense_date": Gt(date(2023, 3, 1))}
+                )
+                == 11
+            )
+        # a cycle of parents should not make the queries endless
+        cats.update(Category("0", pks["3"], pks["0"]))
+        assert {c.name for c in cats.ancestors(pks["3"])} == {"0", "1", "3"}
+        assert [c.name for c in cats.descendants(pks["0"])] == ["1", "2", "3"]
+
+
+def test_create_category_tree(repo: SQLiteRepository):
+    """
+    A tree should be added in one transaction, either all of it or nothing.
+    """
+    with SQLiteCategoryRepository(repo.db_name, repo._pool) as cats:
+        events = []
+        cats.subscribe(events.append)
+        tree = [("0", None)] + [(str(i), str(i // 2)) for i in range(1, 1000)]
+        created = Category.create_from_tree(tree, cats)
+        assert len(events) == 1 and len(events[0]) == 1000
+        assert [c.name for c in cats.ancestors(created[-1].pk)] == [
+            "499",
+            "249",
+            "124",
+            "62",
+            "31",
+            "15",
+            "7",
+            "3",
+            "1",
+            "0",
+        ]
+        with pytest.raises(KeyError):
+            Category.create_from_tree([("a", None), ("b", "c")], cats)
+        assert cats.get_all_where({"name": "a"}) is None
+        assert len(events) == 1
+
+
+def test_row_factory():
+    """
+    Entries should be made of rows whatever the order of the __init__ arguments,
+    and for classes that aren't dataclasses.
+    """
+
+    @dataclass
+    class Reordered:
+        pk: int
+        col2: str
+        col1: int
+
+    class Plain:
+        col1: int
+        col2: str
+        pk: int
+
+        def __init__(self, col1: int, col2: str, pk: int = 0) -> None:
+            self.col1, self.col2, self.pk = col1, col2, pk
+
+    assert row_factory(Reordered, ["col1", "col2"])(None, (3, 1, "a")) == Reordered(
+        3, "a", 1
+    )
+    plain = row_factory(Plain, ["col1", "col2"])(None, (3, 1, "a"))
+    assert (plain.pk, plain.col1, plain.col2) == (3, 1, "a")
+
+
+def test_pk_is_a_parameter(repo: SQLiteRepository, custom_class):
+    """
+    Single-entry statements should pass the pk as a parameter rather than
+    as a part of the SQL text.
+    """
+    pks = repo.add_many(custom_class(i) for i in range(3))
+    assert repo.get("1 OR 1") is None
+    repo.delete("1 OR 1")
+    assert [obj.pk for obj in repo.get_all_where()] == pks
+    for pk in pks:
+        assert repo.get(pk).col1 == pk - 1
+        repo.update(custom_class(0, "bar", pk))
+        repo.delete(pk)
+    assert repo.get_all_where() is None
+
+
+def test_config(tmp_path, custom_class):
+    """
+    Connections should be set up with the pragmas of the config or preset.
+    """
+    db_name = str(tmp_path / "config.db")
+    with SQLiteRepository(db_name, custom_class, config="fast") as repo:
+        con = repo._pool.connection()
+        assert con.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        assert con.execute("PRAGMA synchronous").fetchone() == (1,)
+        assert con.execute("PRAGMA foreign_keys").fetchone() == (1,)
+    config = SQLiteConfig(
+        synchronous="off", cache_size=-1024, temp_store="memory", busy_timeout=100
+    )
+    with SQLiteRepository(db_name, custom_class, config=config) as repo:
+        con = repo._pool.connection()
+        assert con.execute("PRAGMA synchronous").fetchone() == (0,)
+        assert con.execute("PRAGMA cache_size").fetchone() == (-1024,)
+        assert con.execute("PRAGMA temp_store").fetchone() == (2,)
+        assert con.execute("PRAGMA busy_timeout").fetchone() == (100,)
+        # the journal mode of a WAL database is kept
+        assert con.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    with pytest.raises(ValueError):
+        SQLiteRepository(db_name, custom_class, config="fastest")
+    with pytest.raises(ValueError):
+        SQLiteRepository(db_name, custom_class, ConnectionPool(db_name), "fast")
+    with pytest.raises(ValueError):
+        SQLiteConfig(journal_mode="WAL; DROP TABLE custom")
+    with pytest.raises(ValueError):
+        SQLiteConfig(cache_size="1000")
+    with pytest.raises(ValueError):
+        SQLiteConfig(busy_timeout=True)
+    with pytest.raises(ValueError):
+        SQLiteConfig(journal_mode=5)
+
+
+def test_wal_readers_during_write(tmp_path, custom_class):
+    """
+    With WAL a reader should see the last commit while a write is going on.
+    """
+    db_name = str(tmp_path / "wal.db")
+    with SQLiteRepository(db_name, custom_class, config="durable") as repo:
+        pk = repo.add(custom_class(1))
+        read = []
+        with repo.transaction(immediate=True):
+            repo.update(custom_class(2, pk=pk))
+            repo.add(custom_class(3))
+            reader = threading.Thread(
+                target=lambda: read.append(repo.get_all_where())
+            )
+            reader.start()
+            reader.join()
+        assert read == [[custom_class(1, pk=pk)]]
+        assert [obj.col1 for obj in repo.get_all_where()] == [2, 3]
@@ -1,9 +1,10 @@
 import tempfile
+from inspect import isgenerator
 from textwrap import dedent
 
 import pytest
 
-from bookkeeper.utils import read_tree
+from bookkeeper.utils import check_tree, iter_tree, read_tree
 
 
 def test_create_tree():
@@ -79,3 +80,45 @@ def test_with_file():
             ("child2", "parent1"),
             ("parent2", None),
         ]
+
+
+def test_iter_tree_is_lazy():
+    lines = iter(["parent", "    child", "broken"])
+    tree = iter_tree(lines)
+    assert isgenerator(tree)
+    assert next(tree) == ("parent", None)
+    assert next(lines) == "    child"
+
+
+def test_error_line_number():
+    text = "parent1\n\n    child1\n\n        grandchild\n      child2\n"
+    with pytest.raises(IndentationError) as exc:
+        read_tree(text.splitlines())
+    assert exc.value.lineno == 6
+    assert "line 6" in str(exc.value)
+
+
+def test_check_tree():
+    text = dedent(
+        """
+        parent1
+            child1
+                grandchild
+              child2
+          child3
+        parent2
+    """
+    )
+    errors = check_tree(text.splitlines())
+    assert [error.lineno for error in errors] == [5, 6]
+    assert check_tree(["a", "  b", "c"]) == []
+    tree = []
+    assert list(iter_tree(text.splitlines(), tree)) == [
+        ("parent1", None),
+        ("child1", "parent1"),
+        ("grandchild", "child1"),
+        ("child2", "child1"),
+        ("child3", "parent1"),
+        ("parent2", None),
+    ]
+    assert len(tree) == 2